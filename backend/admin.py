@@ -14,8 +14,10 @@ class LectureAdmin(ModelView, model=Lecture):
     form_columns = [Lecture.lecture_date, Lecture.lecture_title, Lecture.educator_id, Lecture.institution_id]
 
 class QuestionAdmin(ModelView, model=Question):
-    column_list = [Question.id, Question.question_text, Question.correct_answer_index, Question.lecture_id]
-    form_columns = [Question.question_text, Question.correct_answer_index, Question.lecture_id]
+    column_list = [Question.id, Question.question_text, Question.correct_answer_index, Question.lecture_id,
+                   Question.opens_at, Question.closes_at]
+    form_columns = [Question.question_text, Question.correct_answer_index, Question.lecture_id,
+                    Question.opens_at, Question.closes_at]
 
 class AnswerOptionAdmin(ModelView, model=AnswerOption):
     column_list = [AnswerOption.id, AnswerOption.answer_text, AnswerOption.option_index, AnswerOption.question_id]
@@ -0,0 +1,247 @@
+"""Incremental refresh of the lecture, educator and institution rollup tables.
+
+    python analytics.py            # refresh lectures changed since their last refresh
+    python analytics.py --full     # recompute every lecture
+"""
+import argparse
+import asyncio
+import os
+import time
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Analytics refresh configuration
+ANALYTICS_REFRESH_INTERVAL_SECONDS = float(os.getenv("ANALYTICS_REFRESH_INTERVAL_SECONDS", "60"))
+# Commits can land with a changed_at slightly older than the refresh that missed them
+ANALYTICS_REFRESH_MARGIN_SECONDS = float(os.getenv("ANALYTICS_REFRESH_MARGIN_SECONDS", "60"))
+
+# Only one refresh runs at a time across all workers
+REFRESH_LOCK_KEY = 7_450_001
+
+# Lectures without stats, whose question count changed, or with content or counters changed since the refresh.
+# Reads question, answer_option and question_result only, never student_answer.
+DIRTY_LECTURES = text("""
+    WITH activity AS (
+        SELECT q.lecture_id,
+               COUNT(DISTINCT q.id) AS question_count,
+               MAX(GREATEST(q.changed_at, o.changed_at, r.changed_at)) AS changed_at
+        FROM question q
+        LEFT JOIN answer_option o ON o.question_id = q.id
+        LEFT JOIN question_result r ON r.answer_option_id = o.id
+        GROUP BY q.lecture_id
+    )
+    SELECT l.id
+    FROM lecture l
+    LEFT JOIN activity a ON a.lecture_id = l.id
+    LEFT JOIN lecture_stats s ON s.lecture_id = l.id
+    WHERE :full
+       OR s.lecture_id IS NULL
+       OR s.question_count <> COALESCE(a.question_count, 0)
+       OR GREATEST(l.changed_at, a.changed_at) >= s.refreshed_at - make_interval(secs => :margin)
+""")
+
+LECTURE_OWNERS = text("""
+    SELECT educator_id, institution_id FROM lecture_stats WHERE lecture_id = ANY(:ids)
+""")
+
+# Answer totals come from the question_result counters; devices and responses from student_answer_key,
+# which holds one row per device and question
+REFRESH_LECTURES = text("""
+    INSERT INTO lecture_stats (lecture_id, educator_id, institution_id, question_count, answer_count,
+                               correct_answer_count, device_count, response_count, possible_responses, refreshed_at)
+    SELECT l.id, l.educator_id, l.institution_id,
+           COALESCE(q.question_count, 0),
+           COALESCE(r.answer_count, 0),
+           COALESCE(r.correct_answer_count, 0),
+           COALESCE(k.device_count, 0),
+           COALESCE(k.response_count, 0),
+           COALESCE(k.device_count, 0) * COALESCE(q.question_count, 0),
+           CURRENT_TIMESTAMP
+    FROM lecture l
+    LEFT JOIN (
+        SELECT lecture_id, COUNT(*) AS question_count
+        FROM question WHERE lecture_id = ANY(:ids) GROUP BY lecture_id
+    ) q ON q.lecture_id = l.id
+    LEFT JOIN (
+        SELECT q.lecture_id,
+               SUM(r.answer_count) AS answer_count,
+               COALESCE(SUM(r.answer_count) FILTER (WHERE o.option_index = q.correct_answer_index), 0) AS correct_answer_count
+        FROM question q
+        JOIN question_result r ON r.question_id = q.id
+        JOIN answer_option o ON o.id = r.answer_option_id
+        WHERE q.lecture_id = ANY(:ids)
+        GROUP BY q.lecture_id
+    ) r ON r.lecture_id = l.id
+    LEFT JOIN (
+        SELECT q.lecture_id, COUNT(DISTINCT k.device_id) AS device_count, COUNT(*) AS response_count
+        FROM question q
+        JOIN student_answer_key k ON k.question_id = q.id
+        WHERE q.lecture_id = ANY(:ids)
+        GROUP BY q.lecture_id
+    ) k ON k.lecture_id = l.id
+    WHERE l.id = ANY(:ids)
+    ON CONFLICT (lecture_id) DO UPDATE SET
+        educator_id = EXCLUDED.educator_id,
+        institution_id = EXCLUDED.institution_id,
+        question_count = EXCLUDED.question_count,
+        answer_count = EXCLUDED.answer_count,
+        correct_answer_count = EXCLUDED.correct_answer_count,
+        device_count = EXCLUDED.device_count,
+        response_count = EXCLUDED.response_count,
+        possible_responses = EXCLUDED.possible_responses,
+        refreshed_at = EXCLUDED.refreshed_at
+""")
+
+# Rollups are refreshed for the owners of refreshed lectures, and for owners that lost lectures
+# (deleted or reassigned lectures no longer appear in lecture_stats under them)
+STALE_OWNERS = """
+    SELECT o.{key} FROM {table} o
+    WHERE o.lecture_count <> (SELECT COUNT(*) FROM lecture_stats s WHERE s.{key} = o.{key})
+"""
+
+REFRESH_OWNERS = """
+    INSERT INTO {table} ({key}, lecture_count, question_count, answer_count, correct_answer_count,
+                         device_count, response_count, possible_responses, refreshed_at)
+    SELECT s.{key}, COUNT(*), SUM(s.question_count), SUM(s.answer_count), SUM(s.correct_answer_count),
+           (SELECT COUNT(DISTINCT k.device_id)
+            FROM lecture l
+            JOIN question q ON q.lecture_id = l.id
+            JOIN student_answer_key k ON k.question_id = q.id
+            WHERE l.{key} = s.{key}),
+           SUM(s.response_count), SUM(s.possible_responses), CURRENT_TIMESTAMP
+    FROM lecture_stats s
+    WHERE s.{key} = ANY(:ids)
+    GROUP BY s.{key}
+    ON CONFLICT ({key}) DO UPDATE SET
+        lecture_count = EXCLUDED.lecture_count,
+        question_count = EXCLUDED.question_count,
+        answer_count = EXCLUDED.answer_count,
+        correct_answer_count = EXCLUDED.correct_answer_count,
+        device_count = EXCLUDED.device_count,
+        response_count = EXCLUDED.response_count,
+        possible_responses = EXCLUDED.possible_responses,
+        refreshed_at = EXCLUDED.refreshed_at
+"""
+
+REMOVE_EMPTY_OWNERS = """
+    DELETE FROM {table} o
+    WHERE o.{key} = ANY(:ids)
+      AND NOT EXISTS (SELECT 1 FROM lecture_stats s WHERE s.{key} = o.{key})
+"""
+
+OWNER_TABLES = (("educators", "educator_stats", "educator_id"), ("institutions", "institution_stats", "institution_id"))
+
+async def _collect_owners(db: AsyncSession, lecture_ids, owners):
+    for row in (await db.execute(LECTURE_OWNERS, {"ids": lecture_ids})).all():
+        for owner_ids, owner_id in zip(owners, row):
+            owner_ids.add(owner_id)
+
+async def refresh_analytics(db: AsyncSession, margin_seconds: float = ANALYTICS_REFRESH_MARGIN_SECONDS,
+                            full: bool = False):
+    # Returns the number of refreshed rows per table, or None if another refresh holds the lock
+    if not (await db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": REFRESH_LOCK_KEY})).scalar():
+        await db.rollback()
+        return None
+
+    lecture_ids = list((await db.execute(DIRTY_LECTURES, {"full": full, "margin": margin_seconds})).scalars())
+    owners = (set(), set())
+    if lecture_ids:
+        # Owners before and after the refresh, so reassigned lectures update both rollups
+        await _collect_owners(db, lecture_ids, owners)
+        await db.execute(REFRESH_LECTURES, {"ids": lecture_ids})
+        await _collect_owners(db, lecture_ids, owners)
+
+    refreshed = {"lectures": len(lecture_ids)}
+    for (name, table, key), owner_ids in zip(OWNER_TABLES, owners):
+        owner_ids |= set((await db.execute(text(STALE_OWNERS.format(table=table, key=key)))).scalars())
+        ids = [owner_id for owner_id in owner_ids if owner_id is not None]
+        if ids:
+            await db.execute(text(REFRESH_OWNERS.format(table=table, key=key)), {"ids": ids})
+            await db.execute(text(REMOVE_EMPTY_OWNERS.format(table=table, key=key)), {"ids": ids})
+        refreshed[name] = len(ids)
+
+    await db.commit()
+    return refreshed
+
+class AnalyticsRefresher:
+    """Periodically refreshes the rollup tables from within the API process."""
+
+    def __init__(self, session_factory, interval_seconds: float, margin_seconds: float):
+        self.session_factory = session_factory
+        self.interval = interval_seconds
+        self.margin = margin_seconds
+        self._task = None
+
+        self.runs = 0
+        self.skipped = 0
+        self.failed = 0
+        self.refreshed_lectures = 0
+        self.last_refresh_ms = 0.0
+        self.last_refreshed = None
+
+    def start(self):
+        if self._task is not None or self.interval <= 0:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def refresh(self, full: bool = False):
+        started = time.monotonic()
+        async with self.session_factory() as db:
+            refreshed = await refresh_analytics(db, self.margin, full)
+        if refreshed is None:
+            self.skipped += 1
+            return None
+        self.runs += 1
+        self.refreshed_lectures += refreshed["lectures"]
+        self.last_refresh_ms = (time.monotonic() - started) * 1000
+        self.last_refreshed = refreshed
+        return refreshed
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failed += 1
+            await asyncio.sleep(self.interval)
+
+    def metrics(self):
+        return {
+            "enabled": self._task is not None,
+            "interval_seconds": self.interval,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "refreshed_lectures": self.refreshed_lectures,
+            "last_refresh_ms": self.last_refresh_ms,
+            "last_refreshed": self.last_refreshed
+        }
+
+async def _main(full: bool):
+    from database import AsyncSessionLocal, async_engine
+    try:
+        async with AsyncSessionLocal() as db:
+            refreshed = await refresh_analytics(db, full=full)
+    finally:
+        await async_engine.dispose()
+    if refreshed is None:
+        print("another refresh is running, skipped")
+    else:
+        print(", ".join(f"{name}: {count}" for name, count in refreshed.items()))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the lecture, educator and institution analytics")
+    parser.add_argument("--full", action="store_true", help="Recompute every lecture instead of changed ones")
+    asyncio.run(_main(parser.parse_args().full))
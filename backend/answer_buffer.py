@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import os
+import time
+from sqlalchemy.exc import DBAPIError, IntegrityError
+import crud
+
+# Write-behind buffer configuration
+ANSWER_BUFFER_ENABLED = os.getenv("ANSWER_BUFFER_ENABLED", "false").lower() in ("1", "true", "yes")
+ANSWER_BUFFER_FLUSH_INTERVAL_MS = float(os.getenv("ANSWER_BUFFER_FLUSH_INTERVAL_MS", "5"))
+ANSWER_BUFFER_MAX_BATCH = int(os.getenv("ANSWER_BUFFER_MAX_BATCH", "500"))
+ANSWER_BUFFER_MAX_PENDING = int(os.getenv("ANSWER_BUFFER_MAX_PENDING", "10000"))
+ANSWER_BUFFER_ACK_TIMEOUT_SECONDS = float(os.getenv("ANSWER_BUFFER_ACK_TIMEOUT_SECONDS", "5"))
+# Times a batch is written again after losing a deadlock or a serialization conflict
+ANSWER_BUFFER_FLUSH_RETRIES = int(os.getenv("ANSWER_BUFFER_FLUSH_RETRIES", "3"))
+
+# deadlock_detected, serialization_failure: the transaction lost to a concurrent one and can be run again
+RETRYABLE_SQLSTATES = ("40P01", "40001")
+
+ANSWER_CONFLICT = "Question or answer option no longer exists"
+
+logger = logging.getLogger("engaged.answer_buffer")
+
+class BufferFull(Exception):
+    pass
+
+class AnswerRejected(Exception):
+    pass
+
+class FlushFailed(Exception):
+    """The batch holding the answer could not be written; the answer was not stored and can be resent."""
+
+class AnswerBuffer:
+    """Collects single answer submissions and writes them as group commits.
+
+    A submission is acknowledged (its future resolved) only after the batch
+    containing it has been committed.
+    """
+
+    def __init__(self, session_factory, flush_interval_ms: float, max_batch: int, max_pending: int,
+                 flush_retries: int = ANSWER_BUFFER_FLUSH_RETRIES):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.flush_retries = flush_retries
+        self._pending = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._stopping = False
+
+        self.enqueued = 0
+        self.flushed_rows = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.retried_flushes = 0
+        self.split_flushes = 0
+        self.rejected_full = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._stopping = False
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    def submit(self, student_answer) -> asyncio.Future:
+        if len(self._pending) >= self.max_pending:
+            self.rejected_full += 1
+            raise BufferFull()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((time.monotonic(), student_answer, future))
+        self.enqueued += 1
+        if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+        return future
+
+    async def _run(self):
+        while True:
+            while not self._pending and not self._stopping:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            if not self._pending:
+                return
+            # Wait until the oldest entry is due or a full batch is available
+            deadline = self._pending[0][0] + self.flush_interval
+            while len(self._pending) < self.max_batch and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        started = time.monotonic()
+        try:
+            outcomes = await self._write([answer for _, answer, _ in batch])
+        except Exception as exc:
+            logger.exception("answer buffer flush of %d rows failed", len(batch))
+            self.failed_flushes += 1
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(FlushFailed(str(exc)))
+            return
+
+        for (_, _, future), outcome in zip(batch, outcomes):
+            if future.done():
+                continue
+            if isinstance(outcome, str):
+                future.set_exception(AnswerRejected(outcome))
+            else:
+                future.set_result(outcome)
+
+        self.flushes += 1
+        self.flushed_rows += len(batch)
+        self.last_flush_ms = (time.monotonic() - started) * 1000
+        self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+
+    async def _write(self, answers):
+        # Returns one outcome per answer, as crud.insert_student_answers does
+        attempt = 0
+        while True:
+            try:
+                async with self.session_factory() as db:
+                    return await crud.insert_student_answers(db, answers)
+            except IntegrityError:
+                # An answer whose question or option was deleted since it was checked fails the whole
+                # transaction: write the halves apart until only that answer is left out
+                if len(answers) == 1:
+                    return [ANSWER_CONFLICT]
+                self.split_flushes += 1
+                middle = len(answers) // 2
+                return await self._write(answers[:middle]) + await self._write(answers[middle:])
+            except DBAPIError as exc:
+                if getattr(exc.orig, "pgcode", None) not in RETRYABLE_SQLSTATES or attempt >= self.flush_retries:
+                    raise
+                attempt += 1
+                self.retried_flushes += 1
+                await asyncio.sleep(self.flush_interval * attempt)
+
+    def metrics(self):
+        return {
+            "enabled": self._task is not None,
+            "pending": len(self._pending),
+            "enqueued": self.enqueued,
+            "flushed_rows": self.flushed_rows,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "retried_flushes": self.retried_flushes,
+            "split_flushes": self.split_flushes,
+            "rejected_full": self.rejected_full,
+            "avg_batch_size": self.flushed_rows / self.flushes if self.flushes else 0.0,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": self.max_flush_ms,
+            "flush_interval_ms": self.flush_interval * 1000,
+            "max_batch": self.max_batch,
+            "max_pending": self.max_pending
+        }
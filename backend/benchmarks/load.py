@@ -0,0 +1,235 @@
+"""Replay live lectures against the API and report latency per endpoint.
+
+Each simulated lecture authors its questions in one request, then runs them
+as polls: the lecture hall (--devices devices) joins by loading the lecture,
+and when a poll opens the devices answer with exponentially distributed
+delays, some changing their answer, while the educator's dashboard polls the
+results. After the last poll some devices reconnect and resync their answers.
+Lectures are created next to an existing one (run benchmarks.seed first) and
+their devices are named "load-...".
+
+By default the app is driven in-process through its ASGI interface, which
+needs the database settings of the API; --base-url drives a running server.
+
+    cd backend && python -m benchmarks.load --lectures 2 --questions 5 --devices 500 --poll-seconds 10
+    cd backend && python -m benchmarks.load --base-url http://localhost:8000 --json results.json
+
+A previous --json file can be passed as --baseline: the run then exits with
+status 1 if any endpoint's p95 latency grew by more than --max-regression, or
+its error rate by more than --max-error-increase, so it can gate a change in CI.
+
+    cd backend && python -m benchmarks.load --baseline results.json --max-regression 0.2
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+import httpx
+import numpy as np
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def request(self, client, endpoint: str, method: str, url: str, **kwargs):
+        # endpoint: the route template the timing is reported under
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[endpoint] += 1
+            return None
+        finally:
+            self.latencies[endpoint].append(time.perf_counter() - started)
+        if response.status_code >= 400 and response.status_code != 404:
+            self.errors[endpoint] += 1
+        return response
+
+    def report(self, elapsed: float):
+        rows = []
+        for endpoint, latencies in sorted(self.latencies.items()):
+            milliseconds = np.array(latencies) * 1000
+            p50, p90, p95, p99 = np.percentile(milliseconds, (50, 90, 95, 99))
+            rows.append({
+                "endpoint": endpoint,
+                "requests": len(latencies),
+                "errors": self.errors[endpoint],
+                "throughput": len(latencies) / elapsed,
+                "p50_ms": p50,
+                "p90_ms": p90,
+                "p95_ms": p95,
+                "p99_ms": p99,
+                "max_ms": milliseconds.max()
+            })
+        return rows
+
+def compare(rows, baseline, max_regression: float, max_error_increase: float, min_requests: int):
+    # Returns (endpoint, measure, baseline, current) per regression. Endpoints with fewer than min_requests
+    # requests in either run are skipped, as their percentiles are mostly noise.
+    previous = {row["endpoint"]: row for row in baseline}
+    regressions = []
+    for row in rows:
+        before = previous.get(row["endpoint"])
+        if before is None or min(row["requests"], before["requests"]) < min_requests:
+            continue
+        if "p95_ms" not in before:
+            raise SystemExit("The baseline has no p95_ms; record it again with this version of the load test")
+        if row["p95_ms"] > before["p95_ms"] * (1 + max_regression):
+            regressions.append((row["endpoint"], "p95 ms", before["p95_ms"], row["p95_ms"]))
+        error_rate = row["errors"] / row["requests"]
+        baseline_error_rate = before["errors"] / before["requests"]
+        if error_rate > baseline_error_rate + max_error_increase:
+            regressions.append((row["endpoint"], "error rate", baseline_error_rate, error_rate))
+    return regressions
+
+async def answer_poll(recorder, client, args, rng, device_id, question, poll_seconds):
+    # One device during one poll: answer after a delay, sometimes change the answer before the poll closes
+    delay = min(rng.expovariate(1 / args.response_seconds), poll_seconds)
+    await asyncio.sleep(delay)
+    options = [option["id"] for option in question["answer_options"]]
+    payload = {"question_id": question["id"], "answer_option_id": rng.choice(options), "device_id": device_id}
+    await recorder.request(client, "POST /student-answers/", "POST", "/student-answers/", json=payload)
+    if rng.random() < args.change_rate and delay < poll_seconds:
+        await asyncio.sleep(rng.uniform(0, poll_seconds - delay))
+        payload["answer_option_id"] = rng.choice(options)
+        await recorder.request(client, "POST /student-answers/", "POST", "/student-answers/", json=payload)
+
+async def dashboard(recorder, client, args, question_id, closed: asyncio.Event):
+    # The educator's screen refreshing the results while the poll is open
+    while not closed.is_set():
+        await recorder.request(client, "GET /questions/{id}/results", "GET", f"/questions/{question_id}/results")
+        try:
+            await asyncio.wait_for(closed.wait(), args.results_interval)
+        except asyncio.TimeoutError:
+            pass
+
+async def join(recorder, client, lecture_id, etag=None):
+    headers = {"If-None-Match": etag} if etag else {}
+    response = await recorder.request(client, "GET /lectures/{id}/full", "GET", f"/lectures/{lecture_id}/full", headers=headers)
+    return response.headers.get("etag") if response is not None else None
+
+async def run_lecture(recorder, client, args, owner, number):
+    rng = random.Random(args.seed * 1000 + number)
+    response = await recorder.request(client, "POST /lectures/", "POST", "/lectures/", json={
+        **owner, "lecture_title": f"Load test lecture {number}", "lecture_date": time.strftime("%Y-%m-%dT%H:%M:%S")
+    })
+    lecture_id = response.json()["id"]
+    tree = {"questions": [
+        {
+            "question_text": f"Load test question {index}",
+            "correct_answer_index": rng.randint(1, 4),
+            "answer_options": [{"answer_text": f"Option {option}", "option_index": option} for option in range(1, 5)]
+        }
+        for index in range(1, args.questions + 1)
+    ]}
+    response = await recorder.request(client, "POST /lectures/{id}/questions", "POST", f"/lectures/{lecture_id}/questions", json=tree)
+    questions = response.json()["questions"]
+    devices = [f"load-{args.seed}-{number}-{device}" for device in range(args.devices)]
+
+    # The hall joins within a few seconds; later joins revalidate with the ETag
+    etag = None
+    async def join_later():
+        await asyncio.sleep(rng.uniform(0, args.join_seconds))
+        await join(recorder, client, lecture_id, etag)
+    etag = await join(recorder, client, lecture_id)
+    await asyncio.gather(*(join_later() for _ in devices[1:]))
+
+    for question in questions:
+        closed = asyncio.Event()
+        screen = asyncio.create_task(dashboard(recorder, client, args, question["id"], closed))
+        await asyncio.gather(*(
+            answer_poll(recorder, client, args, rng, device, question, args.poll_seconds)
+            for device in devices if rng.random() < args.participation
+        ))
+        closed.set()
+        await screen
+        await recorder.request(client, "GET /lectures/{id}/results", "GET", f"/lectures/{lecture_id}/results")
+
+    # Reconnecting devices fetch their answers of this lecture
+    await asyncio.gather(*(
+        recorder.request(client, "GET /student-answers/device/{id}", "GET", f"/student-answers/device/{device}",
+                         params={"lecture_id": lecture_id, "view": "compact"})
+        for device in devices if rng.random() < args.resync_rate
+    ))
+
+async def run(args):
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30)
+        lifespan = None
+    else:
+        import main
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://benchmark", timeout=30)
+        lifespan = main.app.router.lifespan_context(main.app)
+
+    async with client:
+        if lifespan is not None:
+            await lifespan.__aenter__()
+        try:
+            lectures = (await client.get("/lectures/", params={"limit": 1})).json()
+            if not lectures:
+                raise SystemExit("No lecture to copy the educator and institution from; seed the database first")
+            owner = {"educator_id": lectures[0]["educator_id"], "institution_id": lectures[0]["institution_id"]}
+            started = time.perf_counter()
+            await asyncio.gather(*(run_lecture(recorder, client, args, owner, number) for number in range(args.lectures)))
+            elapsed = time.perf_counter() - started
+        finally:
+            if lifespan is not None:
+                await lifespan.__aexit__(None, None, None)
+    return recorder.report(elapsed), elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay live lectures against the API and report latency per endpoint")
+    parser.add_argument("--base-url", help="Drive a running server instead of the app in-process")
+    parser.add_argument("--lectures", type=int, default=1, help="Lectures running at the same time")
+    parser.add_argument("--questions", type=int, default=5, help="Polls per lecture")
+    parser.add_argument("--devices", type=int, default=500, help="Devices in each lecture hall")
+    parser.add_argument("--participation", type=float, default=0.9, help="Share of devices answering a poll")
+    parser.add_argument("--change-rate", type=float, default=0.1, help="Share of answers changed before the poll closes")
+    parser.add_argument("--resync-rate", type=float, default=0.2, help="Share of devices resyncing after the lecture")
+    parser.add_argument("--join-seconds", type=float, default=5, help="Time over which the hall joins")
+    parser.add_argument("--poll-seconds", type=float, default=20, help="Time a poll stays open")
+    parser.add_argument("--response-seconds", type=float, default=4, help="Mean answer delay after a poll opens")
+    parser.add_argument("--results-interval", type=float, default=1, help="Dashboard refresh interval")
+    parser.add_argument("--concurrency", type=int, default=500, help="Connections to a running server")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--baseline", help="Results (--json) of a previous run to check this one against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Largest accepted relative growth of an endpoint's p95 latency over the baseline")
+    parser.add_argument("--max-error-increase", type=float, default=0.01,
+                        help="Largest accepted growth of an endpoint's error rate over the baseline (0.01: one point)")
+    parser.add_argument("--min-requests", type=int, default=20,
+                        help="Endpoints with fewer requests in either run are not checked against the baseline")
+    args = parser.parse_args()
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as source:
+            baseline = json.load(source)["endpoints"]
+
+    rows, elapsed = asyncio.run(run(args))
+    print(f"{sum(row['requests'] for row in rows)} requests in {elapsed:.1f}s")
+    print(f"{'endpoint':<36} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8}")
+    for row in rows:
+        print(f"{row['endpoint']:<36} {row['requests']:>8} {row['errors']:>6} {row['throughput']:>8.1f} "
+              f"{row['p50_ms']:>8.1f} {row['p90_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f}")
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"seconds": elapsed, "endpoints": rows}, output, indent=2)
+
+    if baseline is not None:
+        regressions = compare(rows, baseline, args.max_regression, args.max_error_increase, args.min_requests)
+        for endpoint, measure, before, after in regressions:
+            print(f"REGRESSION {endpoint}: {measure} {before:.3f} -> {after:.3f}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regression against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
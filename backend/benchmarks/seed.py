@@ -0,0 +1,184 @@
+"""Seed a scaled synthetic dataset for benchmarks and load tests.
+
+Institutions, educators and their lectures, questions and answer options are
+generated in Python from --seed; the answers are generated inside PostgreSQL
+with set-based INSERT ... SELECT statements, so millions of rows take minutes
+rather than hours. Each educator has a pool of --devices devices (a lecture
+hall) that attend their lectures, and each device answers a question with
+probability --participation, choosing the correct option with probability
+--accuracy. Answers arrive with exponentially distributed delays after the
+question opens, like in a live poll.
+
+Seeded rows are named "Benchmark ..." and their devices "bench-...", so they
+can be removed again with --reset, together with the lectures created by
+benchmarks.load.
+
+    cd backend && python -m benchmarks.seed --institutions 2 --educators 5 --lectures 10 --questions 20 --devices 500
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import insert, text
+from sqlalchemy.exc import DBAPIError
+import models
+from database import engine
+from partition_maintenance import add_months
+
+# Lectures per INSERT ... SELECT of answers, which bounds the size of one statement
+LECTURES_PER_STATEMENT = 10
+
+ANSWERS = text("""
+    WITH questions AS (
+        SELECT q.id, q.correct_answer_index, l.educator_id, l.lecture_date,
+               row_number() OVER (PARTITION BY q.lecture_id ORDER BY q.id) - 1 AS position
+        FROM question q
+        JOIN lecture l ON l.id = q.lecture_id
+        WHERE l.id = ANY(:lecture_ids)
+    ), picks AS (
+        SELECT q.id AS question_id,
+               'bench-' || q.educator_id || '-' || device AS device_id,
+               CASE WHEN random() < :accuracy THEN q.correct_answer_index
+                    ELSE 1 + floor(random() * :options)::INTEGER END AS option_index,
+               q.lecture_date + make_interval(secs => q.position * :question_seconds
+                   + LEAST(-ln(1 - random()) * :response_seconds, :poll_seconds)) AS answered_at
+        FROM questions q
+        CROSS JOIN generate_series(1, :devices) AS device
+        WHERE random() < :participation
+    ), answers AS (
+        INSERT INTO student_answer (question_id, answer_option_id, device_id, answer_created_at)
+        SELECT p.question_id, o.id, p.device_id, p.answered_at
+        FROM picks p
+        JOIN answer_option o ON o.question_id = p.question_id AND o.option_index = p.option_index
+        RETURNING id, question_id, device_id, answer_created_at
+    )
+    INSERT INTO student_answer_key (device_id, question_id, student_answer_id, answer_created_at)
+    SELECT device_id, question_id, id, answer_created_at FROM answers
+""")
+
+def reset(connection):
+    # Lectures first (cascading to questions, options and answers), as they reference educator_institution
+    connection.execute(text("""
+        DELETE FROM lecture
+        WHERE lecture_title LIKE 'Load test lecture %'
+           OR institution_id IN (SELECT id FROM institution WHERE institution_name LIKE 'Benchmark Institution %')
+    """))
+    connection.execute(text("DELETE FROM institution WHERE institution_name LIKE 'Benchmark Institution %'"))
+    connection.execute(text("DELETE FROM educator WHERE educator_name LIKE 'Benchmark Educator %'"))
+
+def insert_returning_ids(connection, model, rows):
+    result = connection.execute(insert(model).returning(model.id, sort_by_parameter_order=True), rows)
+    return result.scalars().all()
+
+def ensure_partitions(connection, first_month: date, last_month: date):
+    month = first_month
+    while month <= last_month:
+        # A month already holding rows in the default partition cannot get its own partition; those rows stay there
+        try:
+            with connection.begin_nested():
+                connection.execute(text("SELECT create_student_answer_partition(:month)"), {"month": month})
+        except DBAPIError:
+            pass
+        month = add_months(month, 1)
+
+def seed(args):
+    rng = random.Random(args.seed)
+    started = time.monotonic()
+    now = datetime.utcnow().replace(microsecond=0)
+    with engine.begin() as connection:
+        if args.reset:
+            reset(connection)
+        # random() in the answer statements follows the same seed
+        connection.execute(text("SELECT setseed(:seed)"), {"seed": rng.random() * 2 - 1})
+
+        institution_ids = insert_returning_ids(connection, models.Institution, [
+            {"institution_name": f"Benchmark Institution {i}", "institution_location": f"Benchmark City {i}"}
+            for i in range(1, args.institutions + 1)
+        ])
+        educator_ids = insert_returning_ids(connection, models.Educator, [
+            {"educator_name": f"Benchmark Educator {i}", "educator_speciality": rng.choice(["Physics", "Biology", "History"])}
+            for i in range(1, args.institutions * args.educators + 1)
+        ])
+        owners = [(educator_id, institution_ids[index // args.educators]) for index, educator_id in enumerate(educator_ids)]
+        connection.execute(insert(models.educator_institution), [
+            {"educator_id": educator_id, "institution_id": institution_id} for educator_id, institution_id in owners
+        ])
+
+        # Weekly lectures per educator, the last ones in the current week
+        lecture_rows = [
+            {
+                "educator_id": educator_id,
+                "institution_id": institution_id,
+                "lecture_title": f"Benchmark Lecture {number}",
+                "lecture_date": now - timedelta(weeks=args.lectures - number, hours=rng.randint(0, 48))
+            }
+            for educator_id, institution_id in owners
+            for number in range(1, args.lectures + 1)
+        ]
+        lecture_ids = insert_returning_ids(connection, models.Lecture, lecture_rows)
+        question_rows = [
+            {
+                "lecture_id": lecture_id,
+                "question_text": f"Benchmark question {number}",
+                "correct_answer_index": rng.randint(1, args.options)
+            }
+            for lecture_id in lecture_ids
+            for number in range(1, args.questions + 1)
+        ]
+        question_ids = insert_returning_ids(connection, models.Question, question_rows)
+        connection.execute(insert(models.AnswerOption), [
+            {"question_id": question_id, "answer_text": f"Option {index}", "option_index": index}
+            for question_id in question_ids
+            for index in range(1, args.options + 1)
+        ])
+
+        first_lecture = min(row["lecture_date"] for row in lecture_rows)
+        ensure_partitions(connection, date(first_lecture.year, first_lecture.month, 1), date(now.year, now.month, 1))
+
+        answers = 0
+        for start in range(0, len(lecture_ids), LECTURES_PER_STATEMENT):
+            result = connection.execute(ANSWERS, {
+                "lecture_ids": lecture_ids[start:start + LECTURES_PER_STATEMENT],
+                "devices": args.devices,
+                "participation": args.participation,
+                "accuracy": args.accuracy,
+                "options": args.options,
+                "question_seconds": args.question_seconds,
+                "response_seconds": args.response_seconds,
+                "poll_seconds": args.poll_seconds
+            })
+            answers += result.rowcount
+            print(f"\r{answers} answers", end="", flush=True)
+        print()
+
+    return {
+        "institutions": len(institution_ids),
+        "educators": len(educator_ids),
+        "lectures": len(lecture_ids),
+        "questions": len(question_ids),
+        "answer_options": len(question_ids) * args.options,
+        "student_answers": answers,
+        "seconds": round(time.monotonic() - started, 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a scaled synthetic dataset")
+    parser.add_argument("--institutions", type=int, default=2)
+    parser.add_argument("--educators", type=int, default=5, help="Educators per institution")
+    parser.add_argument("--lectures", type=int, default=10, help="Weekly lectures per educator")
+    parser.add_argument("--questions", type=int, default=20, help="Questions per lecture")
+    parser.add_argument("--options", type=int, default=4, help="Answer options per question")
+    parser.add_argument("--devices", type=int, default=500, help="Devices attending each educator's lectures")
+    parser.add_argument("--participation", type=float, default=0.9, help="Share of devices answering a question")
+    parser.add_argument("--accuracy", type=float, default=0.6, help="Share of answers choosing the correct option")
+    parser.add_argument("--question-seconds", type=float, default=180, help="Time between two questions of a lecture")
+    parser.add_argument("--response-seconds", type=float, default=8, help="Mean delay of an answer after the poll opens")
+    parser.add_argument("--poll-seconds", type=float, default=60, help="Longest delay before the poll closes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="Delete previously seeded benchmark data first")
+    args = parser.parse_args()
+    for name, count in seed(args).items():
+        print(f"{name}: {count}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Rows per second of the list routes, entity path versus column path.
+
+The entity path is what the routes did before: load ORM entities, validate
+them into the response schema with from_attributes and render the JSON the
+way FastAPI's JSONResponse does. The column path selects the schema's columns
+as plain rows and renders them with orjson, as pagination.page_response does.
+Both read the same pages of the same table and must produce the same JSON.
+
+    cd backend && python -m benchmarks.serialization --table student_answer --limit 1000 --pages 50
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+import orjson
+from pydantic import TypeAdapter
+from sqlalchemy import select
+import crud
+import models
+import schemas
+from database import AsyncSessionLocal, async_engine
+
+TABLES = {
+    "institution": (models.Institution, schemas.Institution),
+    "educator": (models.Educator, schemas.Educator),
+    "lecture": (models.Lecture, schemas.Lecture),
+    "question": (models.Question, schemas.Question),
+    "answer_option": (models.AnswerOption, schemas.AnswerOption),
+    "student_answer": (models.StudentAnswer, schemas.StudentAnswer),
+}
+
+async def entity_page(db, model, adapter, limit, after_id):
+    result = await db.execute(crud._paginate(select(model), model, 0, limit, after_id))
+    rows = result.scalars().all()
+    content = adapter.dump_python(adapter.validate_python(rows, from_attributes=True), mode="json")
+    body = json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+    return body, rows[-1].id if rows else None
+
+async def column_page(db, model, schema, limit, after_id):
+    result = await db.execute(crud._paginate(select(*crud._columns(schema, model)), model, 0, limit, after_id))
+    rows = result.all()
+    body = orjson.dumps([row._asdict() for row in rows])
+    return body, rows[-1].id if rows else None
+
+async def run(page, pages):
+    # Walks the table by cursor, like a client paging through a list route
+    bodies = []
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        after_id = None
+        for _ in range(pages):
+            body, after_id = await page(db, after_id)
+            if after_id is None:
+                break
+            bodies.append(body)
+            db.expunge_all()
+    return time.perf_counter() - started, bodies
+
+async def main(table, limit, pages, rounds):
+    model, schema = TABLES[table]
+    adapter = TypeAdapter(List[schema])
+    paths = {
+        "entities + pydantic + json": lambda db, after_id: entity_page(db, model, adapter, limit, after_id),
+        "columns + orjson": lambda db, after_id: column_page(db, model, schema, limit, after_id),
+    }
+    try:
+        bodies = {}
+        timings = {name: [] for name in paths}
+        for _ in range(rounds):
+            for name, page in paths.items():
+                elapsed, bodies[name] = await run(page, pages)
+                timings[name].append(elapsed)
+    finally:
+        await async_engine.dispose()
+
+    decoded = [[orjson.loads(body) for body in path_bodies] for path_bodies in bodies.values()]
+    if decoded[0] != decoded[1]:
+        raise SystemExit("The two paths produced different responses")
+    rows = sum(len(page) for page in decoded[0])
+    print(f"{table}: {rows} rows in {len(decoded[0])} pages of {limit}, best of {rounds}")
+    baseline = None
+    for name, elapsed in timings.items():
+        rate = rows / min(elapsed)
+        baseline = baseline or rate
+        print(f"  {name:<28} {rate:>10,.0f} rows/s  x{rate / baseline:.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the entity and column serialization paths of the list routes")
+    parser.add_argument("--table", choices=TABLES, default="student_answer")
+    parser.add_argument("--limit", type=int, default=1000, help="Rows per page")
+    parser.add_argument("--pages", type=int, default=50, help="Pages read per round")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.table, args.limit, args.pages, args.rounds))
@@ -0,0 +1,134 @@
+import os
+import time
+from collections import OrderedDict
+
+# Read-through cache configuration
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")  # memory, redis or none
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "engaged:")
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+class NullCache:
+    backend = "none"
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    async def get(self, key: str, schema):
+        self.stats.misses += 1
+        return None
+
+    async def set(self, key: str, value):
+        pass
+
+    async def delete(self, *keys: str):
+        self.stats.invalidations += len(keys)
+
+    def metrics(self):
+        return {"backend": self.backend, **self.stats.as_dict()}
+
+class MemoryCache(NullCache):
+    """Per-process LRU cache with a TTL, storing schema instances as they are."""
+
+    backend = "memory"
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        super().__init__()
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    async def get(self, key: str, schema):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    async def set(self, key: str, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            if self._entries.pop(key, None) is not None:
+                self.stats.invalidations += 1
+
+    def metrics(self):
+        return {**super().metrics(), "entries": len(self._entries), "max_entries": self.max_entries}
+
+class RedisCache(NullCache):
+    """Shared cache on any client exposing the async redis get/set/delete API.
+
+    Values are stored as JSON and validated back into their schema on read.
+    Expiry and eviction are handled by the server.
+    """
+
+    backend = "redis"
+
+    def __init__(self, client, ttl_seconds: float, key_prefix: str = ""):
+        super().__init__()
+        self.client = client
+        self.ttl = ttl_seconds
+        self.key_prefix = key_prefix
+
+    async def get(self, key: str, schema):
+        raw = await self.client.get(self.key_prefix + key)
+        if raw is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return schema.model_validate_json(raw)
+
+    async def set(self, key: str, value):
+        await self.client.set(self.key_prefix + key, value.model_dump_json(), px=int(self.ttl * 1000))
+
+    async def delete(self, *keys: str):
+        if keys:
+            self.stats.invalidations += await self.client.delete(*(self.key_prefix + key for key in keys))
+
+def create_cache(backend: str = CACHE_BACKEND):
+    if backend == "memory":
+        return MemoryCache(CACHE_TTL_SECONDS, CACHE_MAX_ENTRIES)
+    if backend == "redis":
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requires the redis package")
+        return RedisCache(redis.from_url(CACHE_REDIS_URL), CACHE_TTL_SECONDS, CACHE_KEY_PREFIX)
+    if backend == "none":
+        return NullCache()
+    raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
+
+content_cache = create_cache()
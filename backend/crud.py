@@ -1,86 +1,133 @@
-from sqlalchemy.orm import Session
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import and_, bindparam, delete, func, insert, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 import models
 import schemas
+from live_results import broadcaster
+from cache import content_cache
+from question_state import question_states
 from typing import List, Optional
 
+def _columns(schema, model):
+    # The columns behind a response schema, selected as plain rows instead of hydrated entities
+    return [model.__table__.c[name] for name in schema.model_fields]
+
+def _paginate(query, model, skip: int, limit: int, after_id: Optional[int]):
+    # Keyset pagination on id when a cursor is given; offset is kept for legacy clients
+    query = query.order_by(model.id)
+    if after_id is not None:
+        query = query.filter(model.id > after_id)
+    else:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+async def get_changed_at(db: AsyncSession, model, object_id: int):
+    # Single-column lookup used to answer conditional requests without loading the row
+    result = await db.execute(select(model.changed_at).filter(model.id == object_id))
+    return result.scalar()
+
 # Institution CRUD
-def get_institution(db: Session, institution_id: int):
-    return db.query(models.Institution).filter(models.Institution.id == institution_id).first()
+async def get_institution(db: AsyncSession, institution_id: int):
+    result = await db.execute(select(models.Institution).filter(models.Institution.id == institution_id))
+    return result.scalars().first()
 
-def get_institutions(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Institution).offset(skip).limit(limit).all()
+async def get_institutions(db: AsyncSession, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    result = await db.execute(
+        _paginate(select(*_columns(schemas.Institution, models.Institution)), models.Institution, skip, limit, after_id)
+    )
+    return result.all()
 
-def create_institution(db: Session, institution: schemas.InstitutionCreate):
+async def create_institution(db: AsyncSession, institution: schemas.InstitutionCreate):
     db_institution = models.Institution(
         institution_name=institution.institution_name,
         institution_location=institution.institution_location
     )
     db.add(db_institution)
-    db.commit()
-    db.refresh(db_institution)
+    await db.commit()
+    await db.refresh(db_institution)
     return db_institution
 
-def update_institution(db: Session, institution_id: int, institution: schemas.InstitutionUpdate):
-    db_institution = get_institution(db, institution_id)
+async def update_institution(db: AsyncSession, institution_id: int, institution: schemas.InstitutionUpdate):
+    db_institution = await get_institution(db, institution_id)
     if db_institution:
         update_data = institution.model_dump(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_institution, key, value)
-        db.commit()
-        db.refresh(db_institution)
+        await db.commit()
+        await db.refresh(db_institution)
     return db_institution
 
-def delete_institution(db: Session, institution_id: int):
-    db_institution = get_institution(db, institution_id)
+async def delete_institution(db: AsyncSession, institution_id: int):
+    db_institution = await get_institution(db, institution_id)
     if db_institution:
-        db.delete(db_institution)
-        db.commit()
+        await db.delete(db_institution)
+        await db.commit()
         return True
     return False
 
 # Educator CRUD
-def get_educator(db: Session, educator_id: int):
-    return db.query(models.Educator).filter(models.Educator.id == educator_id).first()
+async def get_educator(db: AsyncSession, educator_id: int):
+    result = await db.execute(select(models.Educator).filter(models.Educator.id == educator_id))
+    return result.scalars().first()
 
-def get_educators(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Educator).offset(skip).limit(limit).all()
+async def get_educators(db: AsyncSession, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    result = await db.execute(
+        _paginate(select(*_columns(schemas.Educator, models.Educator)), models.Educator, skip, limit, after_id)
+    )
+    return result.all()
 
-def create_educator(db: Session, educator: schemas.EducatorCreate):
+async def create_educator(db: AsyncSession, educator: schemas.EducatorCreate):
     db_educator = models.Educator(
         educator_name=educator.educator_name,
         educator_speciality=educator.educator_speciality
     )
     db.add(db_educator)
-    db.commit()
-    db.refresh(db_educator)
+    await db.commit()
+    await db.refresh(db_educator)
     return db_educator
 
-def update_educator(db: Session, educator_id: int, educator: schemas.EducatorUpdate):
-    db_educator = get_educator(db, educator_id)
+async def update_educator(db: AsyncSession, educator_id: int, educator: schemas.EducatorUpdate):
+    db_educator = await get_educator(db, educator_id)
     if db_educator:
         update_data = educator.model_dump(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_educator, key, value)
-        db.commit()
-        db.refresh(db_educator)
+        await db.commit()
+        await db.refresh(db_educator)
     return db_educator
 
-def delete_educator(db: Session, educator_id: int):
-    db_educator = get_educator(db, educator_id)
+async def delete_educator(db: AsyncSession, educator_id: int):
+    db_educator = await get_educator(db, educator_id)
     if db_educator:
-        db.delete(db_educator)
-        db.commit()
+        await db.delete(db_educator)
+        await db.commit()
         return True
     return False
 
 # Lecture CRUD
-def get_lecture(db: Session, lecture_id: int):
-    return db.query(models.Lecture).filter(models.Lecture.id == lecture_id).first()
+async def get_lecture(db: AsyncSession, lecture_id: int):
+    result = await db.execute(select(models.Lecture).filter(models.Lecture.id == lecture_id))
+    return result.scalars().first()
+
+async def get_lectures(db: AsyncSession, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    result = await db.execute(
+        _paginate(select(*_columns(schemas.Lecture, models.Lecture)), models.Lecture, skip, limit, after_id)
+    )
+    return result.all()
 
-def get_lectures(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Lecture).offset(skip).limit(limit).all()
+async def get_lecture_full(db: AsyncSession, lecture_id: int):
+    # Three queries in total (lecture, questions, answer options) whatever the lecture size
+    result = await db.execute(
+        select(models.Lecture)
+        .options(selectinload(models.Lecture.questions).selectinload(models.Question.answer_options))
+        .filter(models.Lecture.id == lecture_id)
+    )
+    return result.scalars().first()
 
-def create_lecture(db: Session, lecture: schemas.LectureCreate):
+async def create_lecture(db: AsyncSession, lecture: schemas.LectureCreate):
     db_lecture = models.Lecture(
         lecture_date=lecture.lecture_date,
         lecture_title=lecture.lecture_title,
@@ -88,135 +135,566 @@ def create_lecture(db: Session, lecture: schemas.LectureCreate):
         institution_id=lecture.institution_id
     )
     db.add(db_lecture)
-    db.commit()
-    db.refresh(db_lecture)
+    await db.commit()
+    await db.refresh(db_lecture)
     return db_lecture
 
-def update_lecture(db: Session, lecture_id: int, lecture: schemas.LectureUpdate):
-    db_lecture = get_lecture(db, lecture_id)
+async def update_lecture(db: AsyncSession, lecture_id: int, lecture: schemas.LectureUpdate):
+    db_lecture = await get_lecture(db, lecture_id)
     if db_lecture:
         update_data = lecture.model_dump(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_lecture, key, value)
-        db.commit()
-        db.refresh(db_lecture)
+        await db.commit()
+        await db.refresh(db_lecture)
+        await content_cache.delete(f"lecture:{lecture_id}", f"lecture_full:{lecture_id}")
     return db_lecture
 
-def delete_lecture(db: Session, lecture_id: int):
-    db_lecture = get_lecture(db, lecture_id)
+async def delete_lecture(db: AsyncSession, lecture_id: int):
+    db_lecture = await get_lecture(db, lecture_id)
     if db_lecture:
-        db.delete(db_lecture)
-        db.commit()
+        result = await db.execute(
+            select(models.Question.id, models.AnswerOption.id)
+            .join(models.AnswerOption, models.AnswerOption.question_id == models.Question.id, isouter=True)
+            .filter(models.Question.lecture_id == lecture_id)
+        )
+        content_keys = {f"lecture:{lecture_id}", f"lecture_full:{lecture_id}"}
+        question_ids = set()
+        for question_id, answer_option_id in result.all():
+            question_ids.add(question_id)
+            content_keys.add(f"question:{question_id}")
+            if answer_option_id is not None:
+                content_keys.add(f"answer_option:{answer_option_id}")
+        await db.delete(db_lecture)
+        await db.commit()
+        await content_cache.delete(*content_keys)
+        question_states.invalidate(*question_ids)
         return True
     return False
 
+async def create_lecture_questions(db: AsyncSession, lecture_id: int, questions: List[schemas.QuestionTreeCreate],
+                                   replace: bool = False):
+    # The whole tree in one transaction: one multi-row INSERT ... RETURNING for the questions, one for their options
+    lecture = await db.execute(select(models.Lecture.id).filter(models.Lecture.id == lecture_id).with_for_update())
+    if lecture.scalar() is None:
+        return None
+    content_keys = {f"lecture_full:{lecture_id}"}
+    question_ids = set()
+    if replace:
+        # Replacing drops the previous questions together with their options and answers
+        result = await db.execute(
+            select(models.Question.id, models.AnswerOption.id)
+            .join(models.AnswerOption, models.AnswerOption.question_id == models.Question.id, isouter=True)
+            .filter(models.Question.lecture_id == lecture_id)
+        )
+        for question_id, answer_option_id in result.all():
+            question_ids.add(question_id)
+            content_keys.add(f"question:{question_id}")
+            if answer_option_id is not None:
+                content_keys.add(f"answer_option:{answer_option_id}")
+        await db.execute(delete(models.Question).filter(models.Question.lecture_id == lecture_id))
+    if questions:
+        result = await db.execute(
+            insert(models.Question).returning(models.Question.id, sort_by_parameter_order=True),
+            [
+                {
+                    "lecture_id": lecture_id,
+                    "question_text": question.question_text,
+                    "correct_answer_index": question.correct_answer_index,
+                    "opens_at": question.opens_at,
+                    "closes_at": question.closes_at
+                }
+                for question in questions
+            ]
+        )
+        await db.execute(
+            insert(models.AnswerOption),
+            [
+                {"question_id": question_id, "answer_text": option.answer_text, "option_index": option.option_index}
+                for question_id, question in zip(result.scalars().all(), questions)
+                for option in question.answer_options
+            ]
+        )
+    await db.commit()
+    await content_cache.delete(*content_keys)
+    question_states.invalidate(*question_ids)
+    return await get_lecture_full(db, lecture_id)
+
 # Question CRUD
-def get_question(db: Session, question_id: int):
-    return db.query(models.Question).filter(models.Question.id == question_id).first()
+async def get_question(db: AsyncSession, question_id: int):
+    result = await db.execute(select(models.Question).filter(models.Question.id == question_id))
+    return result.scalars().first()
 
-def get_questions(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Question).offset(skip).limit(limit).all()
+async def get_questions(db: AsyncSession, skip: int = 0, limit: int = 100, after_id: Optional[int] = None,
+                        lecture_id: Optional[int] = None):
+    query = select(*_columns(schemas.Question, models.Question))
+    if lecture_id is not None:
+        query = query.filter(models.Question.lecture_id == lecture_id)
+    result = await db.execute(_paginate(query, models.Question, skip, limit, after_id))
+    return result.all()
 
-def create_question(db: Session, question: schemas.QuestionCreate):
+async def create_question(db: AsyncSession, question: schemas.QuestionCreate):
     db_question = models.Question(
         lecture_id=question.lecture_id,
         question_text=question.question_text,
-        correct_answer_index=question.correct_answer_index
+        correct_answer_index=question.correct_answer_index,
+        opens_at=question.opens_at,
+        closes_at=question.closes_at
     )
     db.add(db_question)
-    db.commit()
-    db.refresh(db_question)
+    await db.commit()
+    await db.refresh(db_question)
+    await content_cache.delete(f"lecture_full:{db_question.lecture_id}")
     return db_question
 
-def update_question(db: Session, question_id: int, question: schemas.QuestionUpdate):
-    db_question = get_question(db, question_id)
+async def update_question(db: AsyncSession, question_id: int, question: schemas.QuestionUpdate):
+    db_question = await get_question(db, question_id)
     if db_question:
+        previous_lecture_id = db_question.lecture_id
         update_data = question.model_dump(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_question, key, value)
-        db.commit()
-        db.refresh(db_question)
+        await db.commit()
+        await db.refresh(db_question)
+        await content_cache.delete(
+            f"question:{question_id}",
+            f"lecture_full:{previous_lecture_id}",
+            f"lecture_full:{db_question.lecture_id}"
+        )
+        question_states.invalidate(question_id)
     return db_question
 
-def delete_question(db: Session, question_id: int):
-    db_question = get_question(db, question_id)
+async def delete_question(db: AsyncSession, question_id: int):
+    db_question = await get_question(db, question_id)
     if db_question:
-        db.delete(db_question)
-        db.commit()
+        result = await db.execute(
+            select(models.AnswerOption.id).filter(models.AnswerOption.question_id == question_id)
+        )
+        content_keys = [f"question:{question_id}", f"lecture_full:{db_question.lecture_id}"]
+        content_keys += [f"answer_option:{answer_option_id}" for answer_option_id in result.scalars()]
+        await db.delete(db_question)
+        await db.commit()
+        await content_cache.delete(*content_keys)
+        question_states.invalidate(question_id)
         return True
     return False
 
 # Answer Option CRUD
-def get_answer_option(db: Session, answer_option_id: int):
-    return db.query(models.AnswerOption).filter(models.AnswerOption.id == answer_option_id).first()
+async def get_answer_option(db: AsyncSession, answer_option_id: int):
+    result = await db.execute(select(models.AnswerOption).filter(models.AnswerOption.id == answer_option_id))
+    return result.scalars().first()
 
-def get_answer_options(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.AnswerOption).offset(skip).limit(limit).all()
+async def get_answer_options(db: AsyncSession, skip: int = 0, limit: int = 100, after_id: Optional[int] = None,
+                             question_id: Optional[int] = None):
+    query = select(*_columns(schemas.AnswerOption, models.AnswerOption))
+    if question_id is not None:
+        query = query.filter(models.AnswerOption.question_id == question_id)
+    result = await db.execute(_paginate(query, models.AnswerOption, skip, limit, after_id))
+    return result.all()
 
-def create_answer_option(db: Session, answer_option: schemas.AnswerOptionCreate):
+async def create_answer_option(db: AsyncSession, answer_option: schemas.AnswerOptionCreate):
     db_answer_option = models.AnswerOption(
         question_id=answer_option.question_id,
         answer_text=answer_option.answer_text,
         option_index=answer_option.option_index
     )
     db.add(db_answer_option)
-    db.commit()
-    db.refresh(db_answer_option)
+    await db.commit()
+    await db.refresh(db_answer_option)
+    await content_cache.delete(*await _lecture_full_keys(db, db_answer_option.question_id))
+    question_states.invalidate(db_answer_option.question_id)
     return db_answer_option
 
-def update_answer_option(db: Session, answer_option_id: int, answer_option: schemas.AnswerOptionUpdate):
-    db_answer_option = get_answer_option(db, answer_option_id)
+async def update_answer_option(db: AsyncSession, answer_option_id: int, answer_option: schemas.AnswerOptionUpdate):
+    db_answer_option = await get_answer_option(db, answer_option_id)
     if db_answer_option:
+        previous_question_id = db_answer_option.question_id
         update_data = answer_option.model_dump(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_answer_option, key, value)
-        db.commit()
-        db.refresh(db_answer_option)
+        await db.commit()
+        await db.refresh(db_answer_option)
+        await content_cache.delete(
+            f"answer_option:{answer_option_id}",
+            *await _lecture_full_keys(db, previous_question_id, db_answer_option.question_id)
+        )
+        question_states.invalidate(previous_question_id, db_answer_option.question_id)
     return db_answer_option
 
-def delete_answer_option(db: Session, answer_option_id: int):
-    db_answer_option = get_answer_option(db, answer_option_id)
+async def delete_answer_option(db: AsyncSession, answer_option_id: int):
+    db_answer_option = await get_answer_option(db, answer_option_id)
     if db_answer_option:
-        db.delete(db_answer_option)
-        db.commit()
+        content_keys = [f"answer_option:{answer_option_id}"]
+        content_keys += await _lecture_full_keys(db, db_answer_option.question_id)
+        await db.delete(db_answer_option)
+        await db.commit()
+        await content_cache.delete(*content_keys)
+        question_states.invalidate(db_answer_option.question_id)
         return True
     return False
 
+# Cached reads of lecture content, which is effectively read-only while a lecture runs
+async def _cached(key: str, schema, load):
+    value = await content_cache.get(key, schema)
+    if value is None:
+        db_object = await load()
+        if db_object is None:
+            return None
+        value = schema.model_validate(db_object)
+        await content_cache.set(key, value)
+    return value
+
+async def _lecture_full_keys(db: AsyncSession, *question_ids: int):
+    result = await db.execute(
+        select(models.Question.lecture_id).filter(models.Question.id.in_(set(question_ids))).distinct()
+    )
+    return [f"lecture_full:{lecture_id}" for lecture_id in result.scalars()]
+
+async def get_cached_lecture(db: AsyncSession, lecture_id: int):
+    return await _cached(f"lecture:{lecture_id}", schemas.Lecture, lambda: get_lecture(db, lecture_id))
+
+async def get_cached_lecture_full(db: AsyncSession, lecture_id: int):
+    return await _cached(f"lecture_full:{lecture_id}", schemas.LectureFull, lambda: get_lecture_full(db, lecture_id))
+
+async def get_cached_question(db: AsyncSession, question_id: int):
+    return await _cached(f"question:{question_id}", schemas.Question, lambda: get_question(db, question_id))
+
+async def get_cached_answer_option(db: AsyncSession, answer_option_id: int):
+    return await _cached(
+        f"answer_option:{answer_option_id}", schemas.AnswerOption, lambda: get_answer_option(db, answer_option_id)
+    )
+
 # Student Answer CRUD
-def get_student_answer(db: Session, student_answer_id: int):
-    return db.query(models.StudentAnswer).filter(models.StudentAnswer.id == student_answer_id).first()
+async def get_student_answer(db: AsyncSession, student_answer_id: int):
+    result = await db.execute(select(models.StudentAnswer).filter(models.StudentAnswer.id == student_answer_id))
+    return result.scalars().first()
+
+async def get_student_answers(db: AsyncSession, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    result = await db.execute(
+        _paginate(select(*_columns(schemas.StudentAnswer, models.StudentAnswer)), models.StudentAnswer, skip, limit, after_id)
+    )
+    return result.all()
 
-def get_student_answers(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.StudentAnswer).offset(skip).limit(limit).all()
+def student_answer_export_query(lecture_id: Optional[int] = None, question_id: Optional[int] = None,
+                                since: Optional[datetime] = None, until: Optional[datetime] = None):
+    query = select(
+        models.StudentAnswer.id,
+        models.StudentAnswer.question_id,
+        models.StudentAnswer.answer_option_id,
+        models.StudentAnswer.device_id,
+        models.StudentAnswer.answer_created_at
+    ).order_by(models.StudentAnswer.id)
+    if lecture_id is not None:
+        query = query.join(models.Question, models.Question.id == models.StudentAnswer.question_id)
+        query = query.filter(models.Question.lecture_id == lecture_id)
+    if question_id is not None:
+        query = query.filter(models.StudentAnswer.question_id == question_id)
+    if since is not None:
+        query = query.filter(models.StudentAnswer.answer_created_at >= since)
+    if until is not None:
+        query = query.filter(models.StudentAnswer.answer_created_at < until)
+    return query
 
-def get_student_answers_by_device(db: Session, device_id: str):
-    return db.query(models.StudentAnswer).filter(models.StudentAnswer.device_id == device_id).all()
+async def get_student_answers_by_device(db: AsyncSession, device_id: str, limit: int = 100, after_id: Optional[int] = None,
+                                        lecture_id: Optional[int] = None, since: Optional[datetime] = None,
+                                        until: Optional[datetime] = None, compact: bool = False):
+    # Paged by id on idx_student_answer_device_history; compact rows are read from the index alone
+    answer = models.StudentAnswer
+    schema = schemas.StudentAnswerCompact if compact else schemas.StudentAnswer
+    query = select(*_columns(schema, answer)).filter(answer.device_id == device_id)
+    if lecture_id is not None:
+        query = query.filter(answer.question_id.in_(
+            select(models.Question.id).filter(models.Question.lecture_id == lecture_id)
+        ))
+    if since is not None:
+        query = query.filter(answer.answer_created_at >= since)
+    if until is not None:
+        query = query.filter(answer.answer_created_at < until)
+    result = await db.execute(_paginate(query, answer, 0, limit, after_id))
+    return result.all()
 
-def create_student_answer(db: Session, student_answer: schemas.StudentAnswerCreate):
-    db_student_answer = models.StudentAnswer(
-        question_id=student_answer.question_id,
-        answer_option_id=student_answer.answer_option_id,
-        device_id=student_answer.device_id
+async def _upsert_student_answers(db: AsyncSession, rows):
+    # rows: dicts with question_id, answer_option_id and device_id, at most one per (device_id, question_id).
+    # Returns (row, status, previous answer_option_id) per input row, in input order; the caller commits.
+    key = models.StudentAnswerKey
+    now = datetime.utcnow()
+    # Keys are claimed and locked in (device_id, question_id) order, so concurrent batches sharing keys
+    # wait on each other instead of deadlocking
+    claimed = await db.execute(
+        pg_insert(key)
+        .values([{
+            "device_id": row["device_id"],
+            "question_id": row["question_id"],
+            "student_answer_id": func.nextval("student_answer_id_seq"),
+            "answer_created_at": now
+        } for row in sorted(rows, key=lambda row: (row["device_id"], row["question_id"]))])
+        .on_conflict_do_nothing()
+        .returning(key.device_id, key.question_id, key.student_answer_id)
     )
-    db.add(db_student_answer)
-    db.commit()
-    db.refresh(db_student_answer)
-    return db_student_answer
+    new_ids = {(device_id, question_id): answer_id for device_id, question_id, answer_id in claimed.all()}
+
+    outcomes = {}
+    created = [row for row in rows if (row["device_id"], row["question_id"]) in new_ids]
+    if created:
+        stmt = insert(models.StudentAnswer).returning(*models.StudentAnswer.__table__.c, sort_by_parameter_order=True)
+        inserted = await db.execute(stmt, [
+            {**row, "id": new_ids[(row["device_id"], row["question_id"])], "answer_created_at": now}
+            for row in created
+        ])
+        for row, answer in zip(created, inserted.all()):
+            outcomes[(row["device_id"], row["question_id"])] = (answer, "created", None)
+
+    existing = {(row["device_id"], row["question_id"]): row for row in rows
+                if (row["device_id"], row["question_id"]) not in new_ids}
+    if existing:
+        # Lock the current answers so concurrent retries of the same key apply one after another
+        current = await db.execute(
+            select(key.device_id, key.question_id, models.StudentAnswer.id,
+                   models.StudentAnswer.answer_created_at, models.StudentAnswer.answer_option_id)
+            .join(models.StudentAnswer, and_(
+                models.StudentAnswer.id == key.student_answer_id,
+                models.StudentAnswer.answer_created_at == key.answer_created_at
+            ))
+            .filter(tuple_(key.device_id, key.question_id).in_(list(existing)))
+            .order_by(key.device_id, key.question_id)
+            .with_for_update()
+        )
+        current = {(device_id, question_id): (answer_id, created_at, option_id)
+                   for device_id, question_id, answer_id, created_at, option_id in current.all()}
+        changed = [
+            {"answer_id": answer_id, "answered_at": created_at, "option_id": existing[pair]["answer_option_id"]}
+            for pair, (answer_id, created_at, option_id) in current.items()
+            if option_id != existing[pair]["answer_option_id"]
+        ]
+        if changed:
+            # answer_created_at in the filter prunes the update to a single partition
+            table = models.StudentAnswer.__table__
+            await db.execute(
+                update(table)
+                .where(table.c.id == bindparam("answer_id"), table.c.answer_created_at == bindparam("answered_at"))
+                .values(answer_option_id=bindparam("option_id")),
+                changed
+            )
+        answers = await db.execute(
+            select(*models.StudentAnswer.__table__.c)
+            .filter(tuple_(models.StudentAnswer.id, models.StudentAnswer.answer_created_at).in_(
+                [(answer_id, created_at) for answer_id, created_at, _ in current.values()]
+            ))
+        )
+        answers = {answer.id: answer for answer in answers.all()}
+        for pair, (answer_id, _, option_id) in current.items():
+            status = "unchanged" if option_id == existing[pair]["answer_option_id"] else "updated"
+            outcomes[pair] = (answers[answer_id], status, option_id)
+
+    return [outcomes[(row["device_id"], row["question_id"])] for row in rows]
+
+def _publish_upserts(outcomes):
+    deltas = Counter()
+    for answer, status, previous_option_id in outcomes:
+        if status == "created":
+            deltas[(answer.question_id, answer.answer_option_id)] += 1
+        elif status == "updated":
+            deltas[(answer.question_id, previous_option_id)] -= 1
+            deltas[(answer.question_id, answer.answer_option_id)] += 1
+    if deltas:
+        broadcaster.publish(deltas)
 
-def update_student_answer(db: Session, student_answer_id: int, student_answer: schemas.StudentAnswerUpdate):
-    db_student_answer = get_student_answer(db, student_answer_id)
+def _submission(answer, status: str):
+    return schemas.StudentAnswerSubmission(**answer._mapping, status=status)
+
+async def create_student_answer(db: AsyncSession, student_answer: schemas.StudentAnswerCreate):
+    # Returns a StudentAnswerSubmission, or a rejection message if the question's state does not accept the answer
+    rejection, = await question_states.check(db, [student_answer])
+    if rejection is not None:
+        return rejection
+    # Upsert on (device_id, question_id): a retried submission updates the existing answer instead of adding a row
+    outcomes = await _upsert_student_answers(db, [student_answer.model_dump()])
+    await db.commit()
+    _publish_upserts(outcomes)
+    answer, status, _ = outcomes[0]
+    return _submission(answer, status)
+
+async def insert_student_answers(db: AsyncSession, student_answers: List[schemas.StudentAnswerCreate]):
+    # Returns one entry per item: a StudentAnswerSubmission, or a rejection message
+    # Answer windows and option/question pairs are checked against the question state registry before writing
+    outcomes = []
+    rows = {}
+    # Pair -> index of its last item in the batch
+    last = {}
+    for index, (item, rejection) in enumerate(zip(student_answers, await question_states.check(db, student_answers))):
+        if rejection is not None:
+            outcomes.append(rejection)
+            continue
+        # Several answers from one device to the same question in a batch: only the last one is written,
+        # the earlier ones come back superseded by it
+        pair = (item.device_id, item.question_id)
+        rows.pop(pair, None)
+        rows[pair] = item.model_dump()
+        last[pair] = index
+        outcomes.append(pair)
+
+    if rows:
+        upserted = await _upsert_student_answers(db, list(rows.values()))
+        await db.commit()
+        _publish_upserts(upserted)
+        written = {pair: (answer, status) for pair, (answer, status, _) in zip(rows, upserted)}
+        for index, outcome in enumerate(outcomes):
+            if isinstance(outcome, tuple):
+                answer, status = written[outcome]
+                outcomes[index] = _submission(answer, status if last[outcome] == index else "superseded")
+
+    return outcomes
+
+async def create_student_answers(db: AsyncSession, student_answers: List[schemas.StudentAnswerCreate]):
+    results = []
+    for index, outcome in enumerate(await insert_student_answers(db, student_answers)):
+        if isinstance(outcome, str):
+            results.append(schemas.StudentAnswerBatchItem(index=index, status="rejected", detail=outcome))
+        else:
+            results.append(schemas.StudentAnswerBatchItem(index=index, status=outcome.status, id=outcome.id))
+
+    counts = Counter(result.status for result in results)
+    return schemas.StudentAnswerBatchResult(
+        created=counts["created"],
+        updated=counts["updated"],
+        unchanged=counts["unchanged"],
+        superseded=counts["superseded"],
+        rejected=counts["rejected"],
+        results=results
+    )
+
+async def update_student_answer(db: AsyncSession, student_answer_id: int, student_answer: schemas.StudentAnswerUpdate):
+    db_student_answer = await get_student_answer(db, student_answer_id)
     if db_student_answer:
+        previous = (db_student_answer.question_id, db_student_answer.answer_option_id)
+        previous_key = (db_student_answer.device_id, db_student_answer.question_id)
         update_data = student_answer.model_dump(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_student_answer, key, value)
-        db.commit()
-        db.refresh(db_student_answer)
+        if (db_student_answer.device_id, db_student_answer.question_id) != previous_key:
+            # Re-key the answer; if the new device/question already has an answer, that one stays current
+            await db.execute(delete(models.StudentAnswerKey).filter(
+                models.StudentAnswerKey.student_answer_id == db_student_answer.id,
+                models.StudentAnswerKey.answer_created_at == db_student_answer.answer_created_at
+            ))
+            await db.execute(pg_insert(models.StudentAnswerKey).values(
+                device_id=db_student_answer.device_id,
+                question_id=db_student_answer.question_id,
+                student_answer_id=db_student_answer.id,
+                answer_created_at=db_student_answer.answer_created_at
+            ).on_conflict_do_nothing())
+        await db.commit()
+        await db.refresh(db_student_answer)
+        current = (db_student_answer.question_id, db_student_answer.answer_option_id)
+        if current != previous:
+            broadcaster.publish({previous: -1, current: 1})
     return db_student_answer
 
-def delete_student_answer(db: Session, student_answer_id: int):
-    db_student_answer = get_student_answer(db, student_answer_id)
+async def delete_student_answer(db: AsyncSession, student_answer_id: int):
+    db_student_answer = await get_student_answer(db, student_answer_id)
     if db_student_answer:
-        db.delete(db_student_answer)
-        db.commit()
+        await db.delete(db_student_answer)
+        await db.commit()
+        broadcaster.publish({(db_student_answer.question_id, db_student_answer.answer_option_id): -1})
         return True
-    return False 
\ No newline at end of file
+    return False 
+
+# Results (read from the question_result counters, never from student_answer)
+def _results_query():
+    return (
+        select(
+            models.Question.id.label("question_id"),
+            models.Question.question_text,
+            models.Question.correct_answer_index,
+            models.AnswerOption.id.label("answer_option_id"),
+            models.AnswerOption.option_index,
+            models.AnswerOption.answer_text,
+            func.coalesce(models.QuestionResult.answer_count, 0).label("answer_count")
+        )
+        .join(models.AnswerOption, models.AnswerOption.question_id == models.Question.id, isouter=True)
+        .join(
+            models.QuestionResult,
+            and_(
+                models.QuestionResult.question_id == models.Question.id,
+                models.QuestionResult.answer_option_id == models.AnswerOption.id
+            ),
+            isouter=True
+        )
+        .order_by(models.Question.id, models.AnswerOption.option_index)
+    )
+
+def _group_results(rows):
+    questions = {}
+    for row in rows:
+        question = questions.get(row.question_id)
+        if question is None:
+            question = questions[row.question_id] = schemas.QuestionResult(
+                question_id=row.question_id,
+                question_text=row.question_text,
+                correct_answer_index=row.correct_answer_index,
+                total_answers=0,
+                options=[]
+            )
+        if row.answer_option_id is not None:
+            question.options.append(schemas.AnswerOptionResult(
+                answer_option_id=row.answer_option_id,
+                option_index=row.option_index,
+                answer_text=row.answer_text,
+                answer_count=row.answer_count
+            ))
+            question.total_answers += row.answer_count
+    return list(questions.values())
+
+async def get_question_results(db: AsyncSession, question_id: int):
+    result = await db.execute(_results_query().filter(models.Question.id == question_id))
+    questions = _group_results(result.all())
+    return questions[0] if questions else None
+
+async def get_lecture_results(db: AsyncSession, lecture_id: int):
+    db_lecture = await get_lecture(db, lecture_id)
+    if db_lecture is None:
+        return None
+    result = await db.execute(_results_query().filter(models.Question.lecture_id == lecture_id))
+    questions = _group_results(result.all())
+    return schemas.LectureResult(
+        lecture_id=lecture_id,
+        total_answers=sum(question.total_answers for question in questions),
+        questions=questions
+    )
+
+# Analytics (read from the rollup tables refreshed by analytics.py)
+async def get_lecture_stats(db: AsyncSession, lecture_id: int):
+    result = await db.execute(select(models.LectureStats).filter(models.LectureStats.lecture_id == lecture_id))
+    return result.scalars().first()
+
+async def get_lecture_stats_list(db: AsyncSession, skip: int = 0, limit: int = 100, educator_id: Optional[int] = None,
+                                 institution_id: Optional[int] = None):
+    query = select(models.LectureStats).order_by(models.LectureStats.lecture_id)
+    if educator_id is not None:
+        query = query.filter(models.LectureStats.educator_id == educator_id)
+    if institution_id is not None:
+        query = query.filter(models.LectureStats.institution_id == institution_id)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
+async def get_educator_stats(db: AsyncSession, educator_id: int):
+    result = await db.execute(select(models.EducatorStats).filter(models.EducatorStats.educator_id == educator_id))
+    return result.scalars().first()
+
+async def get_educator_stats_list(db: AsyncSession, skip: int = 0, limit: int = 100):
+    result = await db.execute(
+        select(models.EducatorStats).order_by(models.EducatorStats.educator_id).offset(skip).limit(limit)
+    )
+    return result.scalars().all()
+
+async def get_institution_stats(db: AsyncSession, institution_id: int):
+    result = await db.execute(
+        select(models.InstitutionStats).filter(models.InstitutionStats.institution_id == institution_id)
+    )
+    return result.scalars().first()
+
+async def get_institution_stats_list(db: AsyncSession, skip: int = 0, limit: int = 100):
+    result = await db.execute(
+        select(models.InstitutionStats).order_by(models.InstitutionStats.institution_id).offset(skip).limit(limit)
+    )
+    return result.scalars().all()
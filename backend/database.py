@@ -1,7 +1,17 @@
+from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from typing import Optional
+from uuid import uuid4
 import os
+from instrumentation import instrument_engine, timed_pool
+
+# Load environment variables before any setting is read
+load_dotenv()
 
 POSTGRES_USER = os.getenv("POSTGRES_USER", "postgres")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "postgres")
@@ -9,9 +19,83 @@ POSTGRES_DB = os.getenv("POSTGRES_DB", "engaged_data")
 POSTGRES_HOST = os.getenv("POSTGRES_HOST", "db")
 POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
 
-SQLALCHEMY_DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+SQLALCHEMY_DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+)
+# Same database through the asyncpg driver unless configured explicitly
+ASYNC_SQLALCHEMY_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    make_url(SQLALCHEMY_DATABASE_URL).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+)
+
+# Connection pool settings (per process). The async pool serves the API; the
+# sync pool serves the admin UI and command line tools, and the reports pool
+# the answer report endpoint, which holds its connection for a whole COPY.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_SYNC_POOL_SIZE = int(os.getenv("DB_SYNC_POOL_SIZE", "2"))
+DB_SYNC_MAX_OVERFLOW = int(os.getenv("DB_SYNC_MAX_OVERFLOW", "2"))
+DB_REPORTS_POOL_SIZE = int(os.getenv("DB_REPORTS_POOL_SIZE", "2"))
+DB_REPORTS_MAX_OVERFLOW = int(os.getenv("DB_REPORTS_MAX_OVERFLOW", "2"))
+# Transaction-pooling mode for PgBouncer: no server-side prepared statement reuse
+DB_PGBOUNCER_MODE = os.getenv("DB_PGBOUNCER_MODE", "false").lower() in ("1", "true", "yes")
+
+def create_db_engine(url: str, asynchronous: bool = False, pool_size: int = DB_POOL_SIZE,
+                     max_overflow: int = DB_MAX_OVERFLOW, name: Optional[str] = None):
+    # Named like in pool_status() for the checkout and query metrics
+    name = name or ("async" if asynchronous else "sync")
+    options = {
+        "poolclass": timed_pool(AsyncAdaptedQueuePool if asynchronous else QueuePool, name),
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING
+    }
+    if DB_PGBOUNCER_MODE and make_url(url).get_backend_name() == "postgresql" and asynchronous:
+        # asyncpg prepares every statement; with caching disabled and unique names
+        # a statement never outlives the transaction PgBouncer assigned it to
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__"
+        }
+    if asynchronous:
+        db_engine = create_async_engine(url, **options)
+        instrument_engine(db_engine.sync_engine, name)
+    else:
+        db_engine = create_engine(url, **options)
+        instrument_engine(db_engine, name)
+    return db_engine
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+def pool_status():
+    status = {}
+    for name, pool, capacity in (
+        ("async", async_engine.pool, DB_POOL_SIZE + DB_MAX_OVERFLOW),
+        ("sync", engine.pool, DB_SYNC_POOL_SIZE + DB_SYNC_MAX_OVERFLOW),
+        ("reports", reports_engine.pool, DB_REPORTS_POOL_SIZE + DB_REPORTS_MAX_OVERFLOW)
+    ):
+        status[name] = {
+            "size": pool.size(),
+            "capacity": capacity,
+            "open_connections": pool.checkedin() + pool.checkedout(),
+            "checked_out": pool.checkedout(),
+            "utilisation": pool.checkedout() / capacity if capacity else 0.0
+        }
+    return status
+
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL, pool_size=DB_SYNC_POOL_SIZE, max_overflow=DB_SYNC_MAX_OVERFLOW)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base() 
\ No newline at end of file
+# Same driver as the sync engine (COPY goes through psycopg2), so reports do not take the admin UI's connections
+reports_engine = create_db_engine(SQLALCHEMY_DATABASE_URL, pool_size=DB_REPORTS_POOL_SIZE,
+                                  max_overflow=DB_REPORTS_MAX_OVERFLOW, name="reports")
+
+async_engine = create_db_engine(ASYNC_SQLALCHEMY_DATABASE_URL, asynchronous=True)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+Base = declarative_base()
\ No newline at end of file
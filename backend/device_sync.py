@@ -0,0 +1,107 @@
+"""Delta sync of a lecture for devices reconnecting after being offline.
+
+A device keeps a copy of the lecture it attends. Each sync sends the
+watermark of its previous one together with the answers queued meanwhile,
+and gets back only the lecture, question and answer option rows changed
+since then (by changed_at) and the ids removed from the lecture (from
+sync_tombstone). The first sync, or one whose watermark is older than the
+tombstone retention, gets the whole lecture instead.
+
+    python device_sync.py --retention-days 30    # delete older tombstones (run daily, e.g. from cron)
+"""
+import argparse
+import asyncio
+import os
+from datetime import timedelta, timezone
+from sqlalchemy import delete, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+import crud
+import models
+import schemas
+
+# Device sync configuration
+# Commits can land with a changed_at slightly older than the watermark of a sync that missed them,
+# so rows changed this long before the watermark are sent again
+SYNC_WATERMARK_MARGIN_SECONDS = float(os.getenv("SYNC_WATERMARK_MARGIN_SECONDS", "30"))
+# Tombstones are kept this long; older watermarks get a full sync
+SYNC_TOMBSTONE_RETENTION_DAYS = float(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", "30"))
+
+async def sync_lecture(db: AsyncSession, lecture_id: int, sync: schemas.LectureSyncRequest):
+    # Returns a LectureSync, or None if the lecture does not exist
+    Question, AnswerOption, Tombstone = models.Question, models.AnswerOption, models.SyncTombstone
+    # The database clock, which also sets changed_at and deleted_at
+    watermark = (await db.execute(select(func.localtimestamp()))).scalar()
+    since = sync.since
+    if since is not None and since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    full = since is None or since < watermark - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS)
+    cutoff = None if full else since - timedelta(seconds=SYNC_WATERMARK_MARGIN_SECONDS)
+
+    lecture = (await db.execute(
+        select(*crud._columns(schemas.Lecture, models.Lecture)).filter(models.Lecture.id == lecture_id)
+    )).first()
+    if lecture is None:
+        return None
+
+    questions = select(*crud._columns(schemas.Question, Question)).filter(Question.lecture_id == lecture_id)
+    answer_options = (
+        select(*crud._columns(schemas.AnswerOption, AnswerOption))
+        .join(Question, Question.id == AnswerOption.question_id)
+        .filter(Question.lecture_id == lecture_id)
+    )
+    deleted = {"question": [], "answer_option": []}
+    if cutoff is not None:
+        questions = questions.filter(Question.changed_at > cutoff)
+        # A question moved into the lecture brings its unchanged options along
+        answer_options = answer_options.filter(or_(AnswerOption.changed_at > cutoff, Question.changed_at > cutoff))
+        tombstones = await db.execute(
+            select(Tombstone.table_name, Tombstone.row_id)
+            .filter(Tombstone.lecture_id == lecture_id, Tombstone.deleted_at > cutoff)
+        )
+        for table_name, row_id in tombstones.all():
+            deleted[table_name].append(row_id)
+    questions = (await db.execute(questions.order_by(Question.id))).all()
+    answer_options = (await db.execute(answer_options.order_by(AnswerOption.question_id, AnswerOption.option_index))).all()
+
+    # Rows that left the lecture and came back are current again
+    question_ids = {row.id for row in questions}
+    answer_option_ids = {row.id for row in answer_options}
+    result = schemas.LectureSync(
+        watermark=watermark,
+        full=full,
+        lecture=lecture._asdict() if full or lecture.changed_at > cutoff else None,
+        questions=[row._asdict() for row in questions],
+        answer_options=[row._asdict() for row in answer_options],
+        deleted_question_ids=sorted(set(deleted["question"]) - question_ids),
+        deleted_answer_option_ids=sorted(set(deleted["answer_option"]) - answer_option_ids)
+    )
+
+    # Queued answers go through the same upsert as the batch endpoint, so resent ones come back unchanged
+    if sync.answers:
+        result.answers = await crud.create_student_answers(db, [
+            schemas.StudentAnswerCreate(device_id=sync.device_id, **answer.model_dump()) for answer in sync.answers
+        ])
+    return result
+
+async def prune_tombstones(db: AsyncSession, retention_days: float = SYNC_TOMBSTONE_RETENTION_DAYS):
+    result = await db.execute(
+        delete(models.SyncTombstone)
+        .filter(models.SyncTombstone.deleted_at < func.localtimestamp() - timedelta(days=retention_days))
+    )
+    await db.commit()
+    return result.rowcount
+
+async def _main(retention_days: float):
+    from database import AsyncSessionLocal, async_engine
+    try:
+        async with AsyncSessionLocal() as db:
+            pruned = await prune_tombstones(db, retention_days)
+    finally:
+        await async_engine.dispose()
+    print(f"tombstones: {pruned}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete device sync tombstones past their retention")
+    parser.add_argument("--retention-days", type=float, default=SYNC_TOMBSTONE_RETENTION_DAYS)
+    args = parser.parse_args()
+    asyncio.run(_main(args.retention_days))
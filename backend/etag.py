@@ -0,0 +1,28 @@
+import hashlib
+from fastapi import Request, Response
+
+def make_etag(*parts) -> str:
+    # Weak validator: built from changed_at (kept current by the ORM and the
+    # update_changed_at_column trigger), not from the serialized body
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+def lecture_full_etag(lecture) -> str:
+    # Counts catch deleted children, the newest changed_at catches everything else
+    questions = lecture.questions
+    options = [option for question in questions for option in question.answer_options]
+    newest = max([lecture.changed_at] + [item.changed_at for item in questions + options])
+    return make_etag("lecture_full", lecture.id, newest, len(questions), len(options))
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as required for If-None-Match
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
\ No newline at end of file
@@ -0,0 +1,39 @@
+import csv
+import io
+import os
+from datetime import datetime
+import orjson
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+def _ndjson_chunk(columns, rows):
+    # orjson writes datetimes in the same ISO 8601 form as the JSON routes
+    return b"".join(orjson.dumps(dict(zip(columns, row)), option=orjson.OPT_APPEND_NEWLINE) for row in rows)
+
+def _csv_chunk(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(
+        [value.isoformat() if isinstance(value, datetime) else value for value in row]
+        for row in rows
+    )
+    return buffer.getvalue()
+
+async def stream_rows(session_factory, query, export_format: str):
+    # Rows are fetched through a server-side cursor, EXPORT_BATCH_SIZE at a time,
+    # so memory use does not depend on the size of the export
+    async with session_factory() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        columns = list(result.keys())
+        if export_format == "csv":
+            yield _csv_chunk([columns])
+        async for rows in result.partitions():
+            if export_format == "csv":
+                yield _csv_chunk(rows)
+            else:
+                yield _ndjson_chunk(columns, rows)
\ No newline at end of file
@@ -0,0 +1,57 @@
+"""Production server: gunicorn managing one uvicorn worker per core.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+The app is imported once in the master and the workers are forked from it, so
+they start with the modules, ORM mappers and OpenAPI schema already built.
+Migrations are not run here; run `alembic upgrade head` once before starting.
+"""
+import os
+import shutil
+import tempfile
+
+# Server configuration
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+# Each worker is one event loop with its own connection pools (DB_POOL_SIZE per worker)
+workers = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+
+# Cache invalidations only reach the worker that made the change, so with per-worker memory caches the
+# others serve (and answer 304 for) the previous content until their entry expires. Keep that window
+# short unless the cache is shared (CACHE_BACKEND=redis) or its TTL is set explicitly. Set before the
+# app, and so cache.py, is preloaded.
+if workers > 1 and os.getenv("CACHE_BACKEND", "memory") == "memory":
+    os.environ.setdefault("CACHE_TTL_SECONDS", os.getenv("GUNICORN_MEMORY_CACHE_TTL_SECONDS", "5"))
+
+# /metrics aggregates the metric files the workers write to this directory. It must be set
+# before prometheus_client is imported, which happens when the app is preloaded, and the
+# files of a previous run must not be counted again.
+metrics_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "engaged-metrics"))
+shutil.rmtree(metrics_dir, ignore_errors=True)
+os.makedirs(metrics_dir)
+
+def when_ready(server):
+    # Build what the first requests would otherwise build in every worker
+    from sqlalchemy.orm import configure_mappers
+    import main
+
+    configure_mappers()
+    main.app.openapi()
+
+def post_fork(server, worker):
+    # Connections opened by the master must not be shared with the workers
+    from database import engine, reports_engine, async_engine
+
+    engine.dispose(close=False)
+    reports_engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,179 @@
+"""Request, SQL and connection pool instrumentation exported as Prometheus metrics."""
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY,
+                               generate_latest, multiprocess)
+from sqlalchemy import event
+
+# Instrumentation configuration
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "1000"))
+# Requests running more statements than this are logged as likely N+1 patterns
+REQUEST_QUERY_COUNT_WARNING = int(os.getenv("REQUEST_QUERY_COUNT_WARNING", "50"))
+
+logger = logging.getLogger("engaged.performance")
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements run per request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per request",
+    ["method", "route"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "SQL statement latency",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+SLOW_QUERIES = Counter("db_slow_queries", "SQL statements slower than SLOW_QUERY_THRESHOLD_MS", ["engine"])
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_seconds", "Time to obtain a connection from the pool, including waits for a free one",
+    ["engine"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+)
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+# Statements are attributed to the request whose context runs them; the async engine runs
+# them in greenlets that share the request task's context
+_request_stats: ContextVar = ContextVar("request_stats", default=None)
+
+class PoolPressure:
+    """How long checkouts from a pool wait, per process: a decaying average of the recent
+    ones, and the age of the oldest one still waiting."""
+
+    def __init__(self, decay_seconds: float = 1.0):
+        self.decay = decay_seconds
+        self._waiting = OrderedDict()
+        self._average = 0.0
+        self._updated = time.monotonic()
+
+    def started(self):
+        token = object()
+        self._waiting[token] = time.monotonic()
+        return token
+
+    def finished(self, token, seconds: float):
+        del self._waiting[token]
+        now = time.monotonic()
+        # Weighted towards the latest wait, so a sudden queue shows up after a few checkouts
+        self._average = 0.7 * self._decayed(now) + 0.3 * seconds
+        self._updated = now
+
+    def _decayed(self, now: float):
+        # Without new checkouts the average fades, so shedding load also stops once the pool recovers
+        return self._average * math.exp(-(now - self._updated) / self.decay)
+
+    @property
+    def waiting(self):
+        return len(self._waiting)
+
+    def wait_seconds(self):
+        # A stalled pool counts as soon as a checkout has waited long, before any completes
+        now = time.monotonic()
+        oldest = now - next(iter(self._waiting.values()), now)
+        return max(self._decayed(now), oldest)
+
+# By engine name, read by admission control on the answer write path
+pool_pressure = {"async": PoolPressure(), "sync": PoolPressure(), "reports": PoolPressure()}
+
+def timed_pool(pool_class, engine_name: str):
+    # Pool subclass recording how long each checkout took; pools recreated by dispose() keep the class
+    pressure = pool_pressure[engine_name]
+
+    class TimedPool(pool_class):
+        def connect(self):
+            started = time.perf_counter()
+            token = pressure.started()
+            try:
+                return super().connect()
+            finally:
+                elapsed = time.perf_counter() - started
+                pressure.finished(token, elapsed)
+                POOL_CHECKOUT_WAIT.labels(engine_name).observe(elapsed)
+
+    TimedPool.__name__ = f"Timed{pool_class.__name__}"
+    return TimedPool
+
+def instrument_engine(sync_engine, engine_name: str):
+    # sync_engine: an Engine, or AsyncEngine.sync_engine
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        QUERY_LATENCY.labels(engine_name).observe(elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+        if elapsed * 1000 >= SLOW_QUERY_THRESHOLD_MS:
+            SLOW_QUERIES.labels(engine_name).inc()
+            logger.warning("slow query (%s, %.1f ms): %s", engine_name, elapsed * 1000, " ".join(statement.split())[:1000])
+
+class RequestMetricsMiddleware:
+    """ASGI middleware timing each request and the SQL it runs, labelled by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _request_stats.reset(token)
+            elapsed = time.perf_counter() - started
+            # The matched route is added to the scope by the router; unmatched paths share one label
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            REQUEST_LATENCY.labels(method, route, str(status)).observe(elapsed)
+            REQUEST_QUERIES.labels(method, route).observe(stats.queries)
+            REQUEST_DB_TIME.labels(method, route).observe(stats.db_seconds)
+            if elapsed * 1000 >= SLOW_REQUEST_THRESHOLD_MS or stats.queries > REQUEST_QUERY_COUNT_WARNING:
+                logger.warning(
+                    "slow request %s %s: %.1f ms, %d queries, %.1f ms in SQL",
+                    method, route, elapsed * 1000, stats.queries, stats.db_seconds * 1000
+                )
+
+def render_metrics():
+    # With several worker processes, prometheus_client aggregates the files in PROMETHEUS_MULTIPROC_DIR
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
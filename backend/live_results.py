@@ -0,0 +1,128 @@
+import asyncio
+import json
+import os
+import time
+from collections import defaultdict
+
+# Live result stream configuration
+LIVE_RESULTS_INTERVAL_MS = float(os.getenv("LIVE_RESULTS_INTERVAL_MS", "500"))
+LIVE_RESULTS_SNAPSHOT_SECONDS = float(os.getenv("LIVE_RESULTS_SNAPSHOT_SECONDS", "30"))
+LIVE_RESULTS_KEEPALIVE_SECONDS = float(os.getenv("LIVE_RESULTS_KEEPALIVE_SECONDS", "15"))
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _question_ids(snapshot):
+    # Works for both schemas.QuestionResult and schemas.LectureResult
+    return {question.question_id for question in getattr(snapshot, "questions", [snapshot])}
+
+class Subscription:
+    def __init__(self):
+        self.question_ids = set()
+        self.pending = defaultdict(int)
+        self.changed = asyncio.Event()
+
+    def add(self, question_id: int, answer_option_id: int, delta: int):
+        self.pending[(question_id, answer_option_id)] += delta
+        self.changed.set()
+
+    def drain(self):
+        deltas = [
+            {"question_id": question_id, "answer_option_id": answer_option_id, "delta": delta}
+            for (question_id, answer_option_id), delta in self.pending.items()
+            if delta
+        ]
+        self.pending.clear()
+        self.changed.clear()
+        return deltas
+
+class ResultBroadcaster:
+    """In-process fan-out of answer count changes to live result streams.
+
+    Writes publish their deltas once; every open stream interested in the
+    question accumulates them and emits at most one event per interval.
+    Streams also re-send a full snapshot periodically, which picks up writes
+    handled by other worker processes.
+    """
+
+    def __init__(self, interval_ms: float, snapshot_seconds: float, keepalive_seconds: float):
+        self.interval = interval_ms / 1000
+        self.snapshot_interval = snapshot_seconds
+        self.keepalive = keepalive_seconds
+        self._by_question = defaultdict(set)
+
+        self.published = 0
+        self.events_sent = 0
+
+    def publish(self, deltas):
+        # deltas: {(question_id, answer_option_id): change in answer count}
+        self.published += 1
+        for (question_id, answer_option_id), delta in deltas.items():
+            for subscription in self._by_question.get(question_id, ()):
+                subscription.add(question_id, answer_option_id, delta)
+
+    def _watch(self, subscription: Subscription, question_ids):
+        self._unwatch(subscription)
+        subscription.question_ids = set(question_ids)
+        for question_id in subscription.question_ids:
+            self._by_question[question_id].add(subscription)
+
+    def _unwatch(self, subscription: Subscription):
+        for question_id in subscription.question_ids:
+            subscribers = self._by_question.get(question_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._by_question[question_id]
+        subscription.question_ids = set()
+
+    async def stream(self, load_snapshot, snapshot=None):
+        subscription = Subscription()
+        try:
+            while True:
+                if snapshot is None:
+                    snapshot = await load_snapshot()
+                    if snapshot is None:
+                        return
+                self._watch(subscription, _question_ids(snapshot))
+                # The snapshot already reflects everything published so far
+                subscription.drain()
+                yield _sse("snapshot", snapshot.model_dump())
+                self.events_sent += 1
+                snapshot = None
+
+                resync_at = time.monotonic() + self.snapshot_interval
+                while True:
+                    remaining = resync_at - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    timeout = min(self.keepalive, remaining)
+                    try:
+                        await asyncio.wait_for(subscription.changed.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        if timeout == self.keepalive:
+                            yield ": keepalive\n\n"
+                        continue
+                    deltas = subscription.drain()
+                    if deltas:
+                        yield _sse("delta", {"deltas": deltas})
+                        self.events_sent += 1
+                    # Bound the event rate; deltas arriving meanwhile are coalesced
+                    await asyncio.sleep(self.interval)
+        finally:
+            self._unwatch(subscription)
+
+    def metrics(self):
+        return {
+            "subscriptions": len({s for subscribers in self._by_question.values() for s in subscribers}),
+            "watched_questions": len(self._by_question),
+            "published": self.published,
+            "events_sent": self.events_sent,
+            "interval_ms": self.interval * 1000
+        }
+
+broadcaster = ResultBroadcaster(
+    interval_ms=LIVE_RESULTS_INTERVAL_MS,
+    snapshot_seconds=LIVE_RESULTS_SNAPSHOT_SECONDS,
+    keepalive_seconds=LIVE_RESULTS_KEEPALIVE_SECONDS
+)
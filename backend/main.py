@@ -1,54 +1,88 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+import asyncio
 import os
-from dotenv import load_dotenv
-from typing import List
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
+from datetime import datetime, timedelta
 import models
 import schemas
 import crud
-from database import SessionLocal, engine
-from sqladmin import Admin, ModelView
-from admin import (InstitutionAdmin, EducatorAdmin, LectureAdmin, 
-                  QuestionAdmin, AnswerOptionAdmin, StudentAnswerAdmin)
+from database import AsyncSessionLocal, engine, reports_engine, pool_status
+from answer_buffer import (AnswerBuffer, BufferFull, AnswerRejected, FlushFailed, ANSWER_BUFFER_ENABLED,
+                           ANSWER_BUFFER_FLUSH_INTERVAL_MS, ANSWER_BUFFER_MAX_BATCH,
+                           ANSWER_BUFFER_MAX_PENDING, ANSWER_BUFFER_ACK_TIMEOUT_SECONDS)
+from live_results import broadcaster
+from cache import content_cache
+from question_state import question_states
+from pagination import cursor_param, page_response
+from export import EXPORT_FORMATS, stream_rows
+from etag import make_etag, lecture_full_etag, etag_matches, not_modified
+import reports
+import device_sync
+from analytics import AnalyticsRefresher, ANALYTICS_REFRESH_INTERVAL_SECONDS, ANALYTICS_REFRESH_MARGIN_SECONDS
+from instrumentation import RequestMetricsMiddleware, render_metrics
+from rate_limit import (answer_rate_limiter, answer_admission, answer_buckets, retry_after_header,
+                        ANSWER_REJECTIONS, ADMISSION_RETRY_AFTER_SECONDS)
+
+# Admin UI configuration; production workers can skip importing and mounting it
+ADMIN_ENABLED = os.getenv("ADMIN_ENABLED", "true").lower() in ("1", "true", "yes")
 
-# Load environment variables
-load_dotenv()
-
-# Database setup
-SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://postgres:postgres@db:5432/engaged_data")
+# Dependency to get DB session
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
+# Write-behind buffer for single answer submissions
+student_answer_buffer = AnswerBuffer(
+    AsyncSessionLocal,
+    flush_interval_ms=ANSWER_BUFFER_FLUSH_INTERVAL_MS,
+    max_batch=ANSWER_BUFFER_MAX_BATCH,
+    max_pending=ANSWER_BUFFER_MAX_PENDING
+)
 
-models.Base.metadata.create_all(bind=engine)
+# Periodic incremental refresh of the analytics rollups
+analytics_refresher = AnalyticsRefresher(
+    AsyncSessionLocal,
+    interval_seconds=ANALYTICS_REFRESH_INTERVAL_SECONDS,
+    margin_seconds=ANALYTICS_REFRESH_MARGIN_SECONDS
+)
 
-# Dependency to get DB session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if ANSWER_BUFFER_ENABLED:
+        student_answer_buffer.start()
+    analytics_refresher.start()
+    yield
+    await analytics_refresher.stop()
+    await student_answer_buffer.stop()
 
 app = FastAPI(
     title="Engaged Data API",
     description="API for managing educational data including institutions, educators, lectures, questions, and student answers",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Per-route latency, SQL statement count and SQL time, exported at /metrics
+app.add_middleware(RequestMetricsMiddleware)
+
 # Set up admin interface
-admin = Admin(app, engine)
+if ADMIN_ENABLED:
+    from sqladmin import Admin
+    from admin import (InstitutionAdmin, EducatorAdmin, LectureAdmin,
+                       QuestionAdmin, AnswerOptionAdmin, StudentAnswerAdmin)
+
+    admin = Admin(app, engine)
 
-# Add model views to admin
-admin.add_view(InstitutionAdmin)
-admin.add_view(EducatorAdmin)
-admin.add_view(LectureAdmin)
-admin.add_view(QuestionAdmin)
-admin.add_view(AnswerOptionAdmin)
-admin.add_view(StudentAnswerAdmin)
+    # Add model views to admin
+    admin.add_view(InstitutionAdmin)
+    admin.add_view(EducatorAdmin)
+    admin.add_view(LectureAdmin)
+    admin.add_view(QuestionAdmin)
+    admin.add_view(AnswerOptionAdmin)
+    admin.add_view(StudentAnswerAdmin)
 
 @app.get("/")
 async def root():
@@ -59,193 +93,472 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    content, media_type = render_metrics()
+    return Response(content=content, media_type=media_type)
+
+@app.get("/metrics/answer-buffer")
+async def answer_buffer_metrics():
+    return student_answer_buffer.metrics()
+
+@app.get("/metrics/pool")
+async def pool_metrics():
+    return pool_status()
+
+@app.get("/metrics/cache")
+async def cache_metrics():
+    return content_cache.metrics()
+
+@app.get("/metrics/live-results")
+async def live_results_metrics():
+    return broadcaster.metrics()
+
+@app.get("/metrics/question-state")
+async def question_state_metrics():
+    return question_states.metrics()
+
+@app.get("/metrics/rate-limit")
+async def rate_limit_metrics():
+    return {"rate_limiter": answer_rate_limiter.metrics(), "admission": answer_admission.metrics()}
+
+@app.get("/metrics/analytics")
+async def analytics_metrics():
+    return analytics_refresher.metrics()
+
+def event_stream(events):
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Institution endpoints
 @app.post("/institutions/", response_model=schemas.Institution)
-def create_institution(institution: schemas.InstitutionCreate, db: Session = Depends(get_db)):
-    return crud.create_institution(db=db, institution=institution)
+async def create_institution(institution: schemas.InstitutionCreate, db: AsyncSession = Depends(get_db)):
+    return await crud.create_institution(db=db, institution=institution)
 
 @app.get("/institutions/", response_model=List[schemas.Institution])
-def read_institutions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    institutions = crud.get_institutions(db, skip=skip, limit=limit)
-    return institutions
+async def read_institutions(skip: int = 0, limit: int = 100, after_id: Optional[int] = Depends(cursor_param), db: AsyncSession = Depends(get_db)):
+    institutions = await crud.get_institutions(db, skip=skip, limit=limit, after_id=after_id)
+    return page_response(institutions, limit)
 
 @app.get("/institutions/{institution_id}", response_model=schemas.Institution)
-def read_institution(institution_id: int, db: Session = Depends(get_db)):
-    db_institution = crud.get_institution(db, institution_id=institution_id)
+async def read_institution(institution_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    if request.headers.get("if-none-match"):
+        changed_at = await crud.get_changed_at(db, models.Institution, institution_id)
+        etag = make_etag("institution", institution_id, changed_at)
+        if changed_at is not None and etag_matches(request, etag):
+            return not_modified(etag)
+    db_institution = await crud.get_institution(db, institution_id=institution_id)
     if db_institution is None:
         raise HTTPException(status_code=404, detail="Institution not found")
+    response.headers["ETag"] = make_etag("institution", institution_id, db_institution.changed_at)
     return db_institution
 
 @app.put("/institutions/{institution_id}", response_model=schemas.Institution)
-def update_institution(institution_id: int, institution: schemas.InstitutionUpdate, db: Session = Depends(get_db)):
-    db_institution = crud.update_institution(db, institution_id=institution_id, institution=institution)
+async def update_institution(institution_id: int, institution: schemas.InstitutionUpdate, db: AsyncSession = Depends(get_db)):
+    db_institution = await crud.update_institution(db, institution_id=institution_id, institution=institution)
     if db_institution is None:
         raise HTTPException(status_code=404, detail="Institution not found")
     return db_institution
 
 @app.delete("/institutions/{institution_id}")
-def delete_institution(institution_id: int, db: Session = Depends(get_db)):
-    success = crud.delete_institution(db, institution_id=institution_id)
+async def delete_institution(institution_id: int, db: AsyncSession = Depends(get_db)):
+    success = await crud.delete_institution(db, institution_id=institution_id)
     if not success:
         raise HTTPException(status_code=404, detail="Institution not found")
     return {"message": "Institution deleted successfully"}
 
 # Educator endpoints
 @app.post("/educators/", response_model=schemas.Educator)
-def create_educator(educator: schemas.EducatorCreate, db: Session = Depends(get_db)):
-    return crud.create_educator(db=db, educator=educator)
+async def create_educator(educator: schemas.EducatorCreate, db: AsyncSession = Depends(get_db)):
+    return await crud.create_educator(db=db, educator=educator)
 
 @app.get("/educators/", response_model=List[schemas.Educator])
-def read_educators(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    educators = crud.get_educators(db, skip=skip, limit=limit)
-    return educators
+async def read_educators(skip: int = 0, limit: int = 100, after_id: Optional[int] = Depends(cursor_param), db: AsyncSession = Depends(get_db)):
+    educators = await crud.get_educators(db, skip=skip, limit=limit, after_id=after_id)
+    return page_response(educators, limit)
 
 @app.get("/educators/{educator_id}", response_model=schemas.Educator)
-def read_educator(educator_id: int, db: Session = Depends(get_db)):
-    db_educator = crud.get_educator(db, educator_id=educator_id)
+async def read_educator(educator_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    if request.headers.get("if-none-match"):
+        changed_at = await crud.get_changed_at(db, models.Educator, educator_id)
+        etag = make_etag("educator", educator_id, changed_at)
+        if changed_at is not None and etag_matches(request, etag):
+            return not_modified(etag)
+    db_educator = await crud.get_educator(db, educator_id=educator_id)
     if db_educator is None:
         raise HTTPException(status_code=404, detail="Educator not found")
+    response.headers["ETag"] = make_etag("educator", educator_id, db_educator.changed_at)
     return db_educator
 
 @app.put("/educators/{educator_id}", response_model=schemas.Educator)
-def update_educator(educator_id: int, educator: schemas.EducatorUpdate, db: Session = Depends(get_db)):
-    db_educator = crud.update_educator(db, educator_id=educator_id, educator=educator)
+async def update_educator(educator_id: int, educator: schemas.EducatorUpdate, db: AsyncSession = Depends(get_db)):
+    db_educator = await crud.update_educator(db, educator_id=educator_id, educator=educator)
     if db_educator is None:
         raise HTTPException(status_code=404, detail="Educator not found")
     return db_educator
 
 @app.delete("/educators/{educator_id}")
-def delete_educator(educator_id: int, db: Session = Depends(get_db)):
-    success = crud.delete_educator(db, educator_id=educator_id)
+async def delete_educator(educator_id: int, db: AsyncSession = Depends(get_db)):
+    success = await crud.delete_educator(db, educator_id=educator_id)
     if not success:
         raise HTTPException(status_code=404, detail="Educator not found")
     return {"message": "Educator deleted successfully"}
 
 # Lecture endpoints
 @app.post("/lectures/", response_model=schemas.Lecture)
-def create_lecture(lecture: schemas.LectureCreate, db: Session = Depends(get_db)):
-    return crud.create_lecture(db=db, lecture=lecture)
+async def create_lecture(lecture: schemas.LectureCreate, db: AsyncSession = Depends(get_db)):
+    return await crud.create_lecture(db=db, lecture=lecture)
 
 @app.get("/lectures/", response_model=List[schemas.Lecture])
-def read_lectures(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    lectures = crud.get_lectures(db, skip=skip, limit=limit)
-    return lectures
+async def read_lectures(skip: int = 0, limit: int = 100, after_id: Optional[int] = Depends(cursor_param), db: AsyncSession = Depends(get_db)):
+    lectures = await crud.get_lectures(db, skip=skip, limit=limit, after_id=after_id)
+    return page_response(lectures, limit)
 
 @app.get("/lectures/{lecture_id}", response_model=schemas.Lecture)
-def read_lecture(lecture_id: int, db: Session = Depends(get_db)):
-    db_lecture = crud.get_lecture(db, lecture_id=lecture_id)
+async def read_lecture(lecture_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    db_lecture = await crud.get_cached_lecture(db, lecture_id=lecture_id)
     if db_lecture is None:
         raise HTTPException(status_code=404, detail="Lecture not found")
+    etag = make_etag("lecture", lecture_id, db_lecture.changed_at)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return db_lecture
 
+@app.get("/lectures/{lecture_id}/full", response_model=schemas.LectureFull)
+async def read_lecture_full(lecture_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    db_lecture = await crud.get_cached_lecture_full(db, lecture_id=lecture_id)
+    if db_lecture is None:
+        raise HTTPException(status_code=404, detail="Lecture not found")
+    etag = lecture_full_etag(db_lecture)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return db_lecture
+
+@app.get("/lectures/{lecture_id}/results", response_model=schemas.LectureResult)
+async def read_lecture_results(lecture_id: int, db: AsyncSession = Depends(get_db)):
+    lecture_results = await crud.get_lecture_results(db, lecture_id=lecture_id)
+    if lecture_results is None:
+        raise HTTPException(status_code=404, detail="Lecture not found")
+    return lecture_results
+
+@app.get("/lectures/{lecture_id}/results/stream")
+async def stream_lecture_results(lecture_id: int):
+    # No request-scoped session: it would stay checked out, idle in transaction, until the stream ends
+    async def load_snapshot():
+        async with AsyncSessionLocal() as session:
+            return await crud.get_lecture_results(session, lecture_id=lecture_id)
+
+    lecture_results = await load_snapshot()
+    if lecture_results is None:
+        raise HTTPException(status_code=404, detail="Lecture not found")
+
+    return event_stream(broadcaster.stream(load_snapshot, lecture_results))
+
 @app.put("/lectures/{lecture_id}", response_model=schemas.Lecture)
-def update_lecture(lecture_id: int, lecture: schemas.LectureUpdate, db: Session = Depends(get_db)):
-    db_lecture = crud.update_lecture(db, lecture_id=lecture_id, lecture=lecture)
+async def update_lecture(lecture_id: int, lecture: schemas.LectureUpdate, db: AsyncSession = Depends(get_db)):
+    db_lecture = await crud.update_lecture(db, lecture_id=lecture_id, lecture=lecture)
     if db_lecture is None:
         raise HTTPException(status_code=404, detail="Lecture not found")
     return db_lecture
 
 @app.delete("/lectures/{lecture_id}")
-def delete_lecture(lecture_id: int, db: Session = Depends(get_db)):
-    success = crud.delete_lecture(db, lecture_id=lecture_id)
+async def delete_lecture(lecture_id: int, db: AsyncSession = Depends(get_db)):
+    success = await crud.delete_lecture(db, lecture_id=lecture_id)
     if not success:
         raise HTTPException(status_code=404, detail="Lecture not found")
     return {"message": "Lecture deleted successfully"}
 
+@app.post("/lectures/{lecture_id}/questions", response_model=schemas.LectureFull)
+async def create_lecture_questions(lecture_id: int, tree: schemas.LectureQuestionsCreate, db: AsyncSession = Depends(get_db)):
+    db_lecture = await crud.create_lecture_questions(db, lecture_id=lecture_id, questions=tree.questions)
+    if db_lecture is None:
+        raise HTTPException(status_code=404, detail="Lecture not found")
+    return db_lecture
+
+@app.put("/lectures/{lecture_id}/questions", response_model=schemas.LectureFull)
+async def replace_lecture_questions(lecture_id: int, tree: schemas.LectureQuestionsCreate, db: AsyncSession = Depends(get_db)):
+    db_lecture = await crud.create_lecture_questions(db, lecture_id=lecture_id, questions=tree.questions, replace=True)
+    if db_lecture is None:
+        raise HTTPException(status_code=404, detail="Lecture not found")
+    return db_lecture
+
+@app.post("/lectures/{lecture_id}/sync", response_model=schemas.LectureSync)
+async def sync_lecture(lecture_id: int, sync: schemas.LectureSyncRequest, db: AsyncSession = Depends(get_db)):
+    if sync.answers:
+        await admit_answers([(sync.device_id, answer.question_id) for answer in sync.answers])
+    result = await device_sync.sync_lecture(db, lecture_id, sync)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Lecture not found")
+    return result
+
 # Question endpoints
 @app.post("/questions/", response_model=schemas.Question)
-def create_question(question: schemas.QuestionCreate, db: Session = Depends(get_db)):
-    return crud.create_question(db=db, question=question)
+async def create_question(question: schemas.QuestionCreate, db: AsyncSession = Depends(get_db)):
+    return await crud.create_question(db=db, question=question)
 
 @app.get("/questions/", response_model=List[schemas.Question])
-def read_questions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    questions = crud.get_questions(db, skip=skip, limit=limit)
-    return questions
+async def read_questions(skip: int = 0, limit: int = 100, after_id: Optional[int] = Depends(cursor_param),
+                         lecture_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    questions = await crud.get_questions(db, skip=skip, limit=limit, after_id=after_id, lecture_id=lecture_id)
+    return page_response(questions, limit)
 
 @app.get("/questions/{question_id}", response_model=schemas.Question)
-def read_question(question_id: int, db: Session = Depends(get_db)):
-    db_question = crud.get_question(db, question_id=question_id)
+async def read_question(question_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    db_question = await crud.get_cached_question(db, question_id=question_id)
     if db_question is None:
         raise HTTPException(status_code=404, detail="Question not found")
+    etag = make_etag("question", question_id, db_question.changed_at)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return db_question
 
+@app.get("/questions/{question_id}/results", response_model=schemas.QuestionResult)
+async def read_question_results(question_id: int, db: AsyncSession = Depends(get_db)):
+    question_results = await crud.get_question_results(db, question_id=question_id)
+    if question_results is None:
+        raise HTTPException(status_code=404, detail="Question not found")
+    return question_results
+
+@app.get("/questions/{question_id}/results/stream")
+async def stream_question_results(question_id: int):
+    # No request-scoped session: it would stay checked out, idle in transaction, until the stream ends
+    async def load_snapshot():
+        async with AsyncSessionLocal() as session:
+            return await crud.get_question_results(session, question_id=question_id)
+
+    question_results = await load_snapshot()
+    if question_results is None:
+        raise HTTPException(status_code=404, detail="Question not found")
+
+    return event_stream(broadcaster.stream(load_snapshot, question_results))
+
 @app.put("/questions/{question_id}", response_model=schemas.Question)
-def update_question(question_id: int, question: schemas.QuestionUpdate, db: Session = Depends(get_db)):
-    db_question = crud.update_question(db, question_id=question_id, question=question)
+async def update_question(question_id: int, question: schemas.QuestionUpdate, db: AsyncSession = Depends(get_db)):
+    db_question = await crud.update_question(db, question_id=question_id, question=question)
+    if db_question is None:
+        raise HTTPException(status_code=404, detail="Question not found")
+    return db_question
+
+@app.post("/questions/{question_id}/open", response_model=schemas.Question)
+async def open_question(question_id: int, duration_seconds: Optional[float] = Query(None, gt=0),
+                        db: AsyncSession = Depends(get_db)):
+    # Accept answers from now on, until closed or for duration_seconds
+    now = datetime.utcnow()
+    closes_at = now + timedelta(seconds=duration_seconds) if duration_seconds else None
+    window = schemas.QuestionUpdate(opens_at=now, closes_at=closes_at)
+    db_question = await crud.update_question(db, question_id=question_id, question=window)
+    if db_question is None:
+        raise HTTPException(status_code=404, detail="Question not found")
+    return db_question
+
+@app.post("/questions/{question_id}/close", response_model=schemas.Question)
+async def close_question(question_id: int, db: AsyncSession = Depends(get_db)):
+    window = schemas.QuestionUpdate(closes_at=datetime.utcnow())
+    db_question = await crud.update_question(db, question_id=question_id, question=window)
     if db_question is None:
         raise HTTPException(status_code=404, detail="Question not found")
     return db_question
 
 @app.delete("/questions/{question_id}")
-def delete_question(question_id: int, db: Session = Depends(get_db)):
-    success = crud.delete_question(db, question_id=question_id)
+async def delete_question(question_id: int, db: AsyncSession = Depends(get_db)):
+    success = await crud.delete_question(db, question_id=question_id)
     if not success:
         raise HTTPException(status_code=404, detail="Question not found")
     return {"message": "Question deleted successfully"}
 
 # Answer Option endpoints
 @app.post("/answer-options/", response_model=schemas.AnswerOption)
-def create_answer_option(answer_option: schemas.AnswerOptionCreate, db: Session = Depends(get_db)):
-    return crud.create_answer_option(db=db, answer_option=answer_option)
+async def create_answer_option(answer_option: schemas.AnswerOptionCreate, db: AsyncSession = Depends(get_db)):
+    return await crud.create_answer_option(db=db, answer_option=answer_option)
 
 @app.get("/answer-options/", response_model=List[schemas.AnswerOption])
-def read_answer_options(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    answer_options = crud.get_answer_options(db, skip=skip, limit=limit)
-    return answer_options
+async def read_answer_options(skip: int = 0, limit: int = 100, after_id: Optional[int] = Depends(cursor_param),
+                              question_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    answer_options = await crud.get_answer_options(db, skip=skip, limit=limit, after_id=after_id, question_id=question_id)
+    return page_response(answer_options, limit)
 
 @app.get("/answer-options/{answer_option_id}", response_model=schemas.AnswerOption)
-def read_answer_option(answer_option_id: int, db: Session = Depends(get_db)):
-    db_answer_option = crud.get_answer_option(db, answer_option_id=answer_option_id)
+async def read_answer_option(answer_option_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    db_answer_option = await crud.get_cached_answer_option(db, answer_option_id=answer_option_id)
     if db_answer_option is None:
         raise HTTPException(status_code=404, detail="Answer option not found")
+    etag = make_etag("answer_option", answer_option_id, db_answer_option.changed_at)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return db_answer_option
 
 @app.put("/answer-options/{answer_option_id}", response_model=schemas.AnswerOption)
-def update_answer_option(answer_option_id: int, answer_option: schemas.AnswerOptionUpdate, db: Session = Depends(get_db)):
-    db_answer_option = crud.update_answer_option(db, answer_option_id=answer_option_id, answer_option=answer_option)
+async def update_answer_option(answer_option_id: int, answer_option: schemas.AnswerOptionUpdate, db: AsyncSession = Depends(get_db)):
+    db_answer_option = await crud.update_answer_option(db, answer_option_id=answer_option_id, answer_option=answer_option)
     if db_answer_option is None:
         raise HTTPException(status_code=404, detail="Answer option not found")
     return db_answer_option
 
 @app.delete("/answer-options/{answer_option_id}")
-def delete_answer_option(answer_option_id: int, db: Session = Depends(get_db)):
-    success = crud.delete_answer_option(db, answer_option_id=answer_option_id)
+async def delete_answer_option(answer_option_id: int, db: AsyncSession = Depends(get_db)):
+    success = await crud.delete_answer_option(db, answer_option_id=answer_option_id)
     if not success:
         raise HTTPException(status_code=404, detail="Answer option not found")
     return {"message": "Answer option deleted successfully"}
 
 # Student Answer endpoints
-@app.post("/student-answers/", response_model=schemas.StudentAnswer)
-def create_student_answer(student_answer: schemas.StudentAnswerCreate, db: Session = Depends(get_db)):
-    return crud.create_student_answer(db=db, student_answer=student_answer)
+async def admit_answers(pairs):
+    # pairs: (device_id, question_id) per answer. Admission control runs first, so shed submissions keep their tokens.
+    if not answer_admission.admit():
+        ANSWER_REJECTIONS.labels("overloaded").inc()
+        raise HTTPException(status_code=503, detail="Server is busy, retry later",
+                            headers=retry_after_header(ADMISSION_RETRY_AFTER_SECONDS))
+    wait = await answer_rate_limiter.acquire(answer_buckets(pairs))
+    if wait:
+        ANSWER_REJECTIONS.labels("rate_limited").inc()
+        raise HTTPException(status_code=429, detail="Too many answers, retry later", headers=retry_after_header(wait))
+
+@app.post("/student-answers/", response_model=schemas.StudentAnswerSubmission)
+async def create_student_answer(student_answer: schemas.StudentAnswerCreate, db: AsyncSession = Depends(get_db)):
+    await admit_answers([(student_answer.device_id, student_answer.question_id)])
+    if ANSWER_BUFFER_ENABLED:
+        # Rejected before taking a place in the buffer; the flush checks again, from memory
+        rejection, = await question_states.check(db, [student_answer])
+        if rejection is not None:
+            raise HTTPException(status_code=400, detail=rejection)
+        # A registry miss read the question; don't hold its connection while the answer waits in the buffer
+        await db.rollback()
+        try:
+            future = student_answer_buffer.submit(student_answer)
+        except BufferFull:
+            raise HTTPException(status_code=503, detail="Answer buffer is full, retry later",
+                                headers=retry_after_header(ADMISSION_RETRY_AFTER_SECONDS))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), ANSWER_BUFFER_ACK_TIMEOUT_SECONDS)
+        except AnswerRejected as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        except FlushFailed:
+            raise HTTPException(status_code=503, detail="Answer could not be stored, retry later",
+                                headers=retry_after_header(ADMISSION_RETRY_AFTER_SECONDS))
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="Answer was not acknowledged in time, retry later",
+                                headers=retry_after_header(ADMISSION_RETRY_AFTER_SECONDS))
+    submission = await crud.create_student_answer(db=db, student_answer=student_answer)
+    if isinstance(submission, str):
+        raise HTTPException(status_code=400, detail=submission)
+    return submission
+
+@app.post("/student-answers/batch", response_model=schemas.StudentAnswerBatchResult)
+async def create_student_answers(batch: schemas.StudentAnswerBatchCreate, db: AsyncSession = Depends(get_db)):
+    await admit_answers([(answer.device_id, answer.question_id) for answer in batch.answers])
+    return await crud.create_student_answers(db=db, student_answers=batch.answers)
 
 @app.get("/student-answers/", response_model=List[schemas.StudentAnswer])
-def read_student_answers(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    student_answers = crud.get_student_answers(db, skip=skip, limit=limit)
-    return student_answers
+async def read_student_answers(skip: int = 0, limit: int = 100, after_id: Optional[int] = Depends(cursor_param), db: AsyncSession = Depends(get_db)):
+    student_answers = await crud.get_student_answers(db, skip=skip, limit=limit, after_id=after_id)
+    return page_response(student_answers, limit)
+
+@app.get("/student-answers/export")
+async def export_student_answers(format: str = Query("ndjson", pattern="^(ndjson|csv)$"), lecture_id: Optional[int] = None,
+                                 question_id: Optional[int] = None, since: Optional[datetime] = None, until: Optional[datetime] = None):
+    query = crud.student_answer_export_query(lecture_id=lecture_id, question_id=question_id, since=since, until=until)
+    return StreamingResponse(
+        stream_rows(AsyncSessionLocal, query, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename=student_answers.{format}"}
+    )
 
 @app.get("/student-answers/{student_answer_id}", response_model=schemas.StudentAnswer)
-def read_student_answer(student_answer_id: int, db: Session = Depends(get_db)):
-    db_student_answer = crud.get_student_answer(db, student_answer_id=student_answer_id)
+async def read_student_answer(student_answer_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    if request.headers.get("if-none-match"):
+        changed_at = await crud.get_changed_at(db, models.StudentAnswer, student_answer_id)
+        etag = make_etag("student_answer", student_answer_id, changed_at)
+        if changed_at is not None and etag_matches(request, etag):
+            return not_modified(etag)
+    db_student_answer = await crud.get_student_answer(db, student_answer_id=student_answer_id)
     if db_student_answer is None:
         raise HTTPException(status_code=404, detail="Student answer not found")
+    response.headers["ETag"] = make_etag("student_answer", student_answer_id, db_student_answer.changed_at)
     return db_student_answer
 
-@app.get("/student-answers/device/{device_id}", response_model=List[schemas.StudentAnswer])
-def read_student_answers_by_device(device_id: str, db: Session = Depends(get_db)):
-    student_answers = crud.get_student_answers_by_device(db, device_id=device_id)
-    return student_answers
+@app.get("/student-answers/device/{device_id}",
+         response_model=Union[List[schemas.StudentAnswer], List[schemas.StudentAnswerCompact]])
+async def read_student_answers_by_device(device_id: str, limit: int = Query(100, ge=1, le=schemas.DEVICE_HISTORY_MAX_LIMIT),
+                                         after_id: Optional[int] = Depends(cursor_param), lecture_id: Optional[int] = None,
+                                         since: Optional[datetime] = None, until: Optional[datetime] = None,
+                                         view: str = Query("full", pattern="^(full|compact)$"),
+                                         db: AsyncSession = Depends(get_db)):
+    student_answers = await crud.get_student_answers_by_device(
+        db, device_id=device_id, limit=limit, after_id=after_id, lecture_id=lecture_id,
+        since=since, until=until, compact=view == "compact"
+    )
+    return page_response(student_answers, limit)
 
 @app.put("/student-answers/{student_answer_id}", response_model=schemas.StudentAnswer)
-def update_student_answer(student_answer_id: int, student_answer: schemas.StudentAnswerUpdate, db: Session = Depends(get_db)):
-    db_student_answer = crud.update_student_answer(db, student_answer_id=student_answer_id, student_answer=student_answer)
+async def update_student_answer(student_answer_id: int, student_answer: schemas.StudentAnswerUpdate, db: AsyncSession = Depends(get_db)):
+    db_student_answer = await crud.update_student_answer(db, student_answer_id=student_answer_id, student_answer=student_answer)
     if db_student_answer is None:
         raise HTTPException(status_code=404, detail="Student answer not found")
     return db_student_answer
 
 @app.delete("/student-answers/{student_answer_id}")
-def delete_student_answer(student_answer_id: int, db: Session = Depends(get_db)):
-    success = crud.delete_student_answer(db, student_answer_id=student_answer_id)
+async def delete_student_answer(student_answer_id: int, db: AsyncSession = Depends(get_db)):
+    success = await crud.delete_student_answer(db, student_answer_id=student_answer_id)
     if not success:
         raise HTTPException(status_code=404, detail="Student answer not found")
-    return {"message": "Student answer deleted successfully"} 
\ No newline at end of file
+    return {"message": "Student answer deleted successfully"} 
+
+# Analytics endpoints (precomputed rollups, refreshed incrementally)
+@app.get("/analytics/lectures", response_model=List[schemas.LectureStats])
+async def read_lecture_stats_list(skip: int = 0, limit: int = 100, educator_id: Optional[int] = None,
+                                  institution_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    return await crud.get_lecture_stats_list(db, skip=skip, limit=limit, educator_id=educator_id,
+                                             institution_id=institution_id)
+
+@app.get("/analytics/lectures/{lecture_id}", response_model=schemas.LectureStats)
+async def read_lecture_stats(lecture_id: int, db: AsyncSession = Depends(get_db)):
+    stats = await crud.get_lecture_stats(db, lecture_id=lecture_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Lecture analytics not found")
+    return stats
+
+@app.get("/analytics/educators", response_model=List[schemas.EducatorStats])
+async def read_educator_stats_list(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    return await crud.get_educator_stats_list(db, skip=skip, limit=limit)
+
+@app.get("/analytics/educators/{educator_id}", response_model=schemas.EducatorStats)
+async def read_educator_stats(educator_id: int, db: AsyncSession = Depends(get_db)):
+    stats = await crud.get_educator_stats(db, educator_id=educator_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Educator analytics not found")
+    return stats
+
+@app.get("/analytics/institutions", response_model=List[schemas.InstitutionStats])
+async def read_institution_stats_list(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    return await crud.get_institution_stats_list(db, skip=skip, limit=limit)
+
+@app.get("/analytics/institutions/{institution_id}", response_model=schemas.InstitutionStats)
+async def read_institution_stats(institution_id: int, db: AsyncSession = Depends(get_db)):
+    stats = await crud.get_institution_stats(db, institution_id=institution_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Institution analytics not found")
+    return stats
+
+@app.post("/analytics/refresh", response_model=schemas.AnalyticsRefreshResult)
+async def refresh_analytics(full: bool = False):
+    refreshed = await analytics_refresher.refresh(full=full)
+    if refreshed is None:
+        raise HTTPException(status_code=409, detail="An analytics refresh is already running")
+    return refreshed
+
+# Report endpoints
+@app.get("/reports/answers", response_model=schemas.AnswerReport)
+def read_answer_report(lecture_id: Optional[int] = None, educator_id: Optional[int] = None,
+                       institution_id: Optional[int] = None, since: Optional[datetime] = None,
+                       until: Optional[datetime] = None):
+    # CPU-bound: a plain def runs in the threadpool, on the sync driver used for COPY, from its own pool
+    with reports_engine.connect() as connection:
+        return reports.answer_report(connection, lecture_id=lecture_id, educator_id=educator_id,
+                                     institution_id=institution_id, since=since, until=until)
@@ -0,0 +1,104 @@
+"""Per-option answer counters
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+
+Adds question_result and the statement-level triggers that maintain it,
+then fills the counters from the answers already stored.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+TABLE = """
+-- Create question_result table (per-option answer counters maintained by triggers)
+CREATE TABLE question_result (
+    question_id INTEGER REFERENCES question(id) ON DELETE CASCADE,
+    answer_option_id INTEGER REFERENCES answer_option(id) ON DELETE CASCADE,
+    answer_count INTEGER NOT NULL DEFAULT 0,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (question_id, answer_option_id)
+);
+"""
+
+COUNTERS = """
+-- Create function to keep question_result counters in sync with student_answer.
+-- Runs once per statement, so a multi-row insert touches each counter row once.
+CREATE OR REPLACE FUNCTION update_question_result_counts()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Decrements only update existing counters; cascaded deletes may already have removed them
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE question_result r
+        SET answer_count = r.answer_count - d.answer_count,
+            changed_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT question_id, answer_option_id, COUNT(*) AS answer_count
+            FROM old_answers
+            WHERE question_id IS NOT NULL AND answer_option_id IS NOT NULL
+            GROUP BY question_id, answer_option_id
+        ) d
+        WHERE r.question_id = d.question_id
+          AND r.answer_option_id = d.answer_option_id;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO question_result (question_id, answer_option_id, answer_count)
+        SELECT question_id, answer_option_id, COUNT(*)
+        FROM new_answers
+        WHERE question_id IS NOT NULL AND answer_option_id IS NOT NULL
+        GROUP BY question_id, answer_option_id
+        ORDER BY question_id, answer_option_id
+        ON CONFLICT (question_id, answer_option_id) DO UPDATE
+        SET answer_count = question_result.answer_count + EXCLUDED.answer_count,
+            changed_at = CURRENT_TIMESTAMP;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER student_answer_results_insert
+    AFTER INSERT ON student_answer
+    REFERENCING NEW TABLE AS new_answers
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION update_question_result_counts();
+
+CREATE TRIGGER student_answer_results_update
+    AFTER UPDATE ON student_answer
+    REFERENCING OLD TABLE AS old_answers NEW TABLE AS new_answers
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION update_question_result_counts();
+
+CREATE TRIGGER student_answer_results_delete
+    AFTER DELETE ON student_answer
+    REFERENCING OLD TABLE AS old_answers
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION update_question_result_counts();
+"""
+
+BACKFILL = """
+INSERT INTO question_result (question_id, answer_option_id, answer_count)
+SELECT question_id, answer_option_id, COUNT(*)
+FROM student_answer
+WHERE question_id IS NOT NULL AND answer_option_id IS NOT NULL
+GROUP BY question_id, answer_option_id;
+"""
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table("question_result"):
+        return
+    op.execute(TABLE)
+    op.execute(BACKFILL)
+    op.execute(COUNTERS)
+
+def downgrade():
+    for operation in ("insert", "update", "delete"):
+        op.execute(f"DROP TRIGGER IF EXISTS student_answer_results_{operation} ON student_answer")
+    op.execute("DROP FUNCTION IF EXISTS update_question_result_counts()")
+    op.execute("DROP TABLE IF EXISTS question_result")
@@ -0,0 +1,140 @@
+"""Partition student_answer by month
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+
+Rebuilds an unpartitioned student_answer as a table range-partitioned on
+answer_created_at. Partitions are created for every month holding answers
+and the next two months, and the rows are copied over keeping their ids.
+The table is locked while the rows are copied, so run it in a maintenance
+window on large databases. question_result is left as it is: its triggers
+are only attached to the new table after the copy.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+# Dropped from the old table first so the new table gets the same constraint names
+CONSTRAINTS = ["student_answer_pkey", "student_answer_question_id_fkey", "student_answer_answer_option_id_fkey"]
+
+COLUMNS = "id, created_at, changed_at, question_id, answer_option_id, device_id, answer_created_at"
+
+PARTITION_FUNCTION = """
+CREATE OR REPLACE FUNCTION create_student_answer_partition(month DATE)
+RETURNS TEXT AS $$
+DECLARE
+    partition_start DATE := date_trunc('month', month)::DATE;
+    partition_name TEXT := 'student_answer_' || to_char(partition_start, 'YYYY_MM');
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF student_answer FOR VALUES FROM (%L) TO (%L)',
+        partition_name, partition_start, (partition_start + INTERVAL '1 month')::DATE
+    );
+    RETURN partition_name;
+END;
+$$ language 'plpgsql';
+"""
+
+TRIGGERS = """
+CREATE INDEX idx_student_answer_question ON student_answer(question_id);
+CREATE INDEX idx_student_answer_device ON student_answer(device_id);
+
+CREATE TRIGGER update_student_answer_changed_at
+    BEFORE UPDATE ON student_answer
+    FOR EACH ROW
+    EXECUTE FUNCTION update_changed_at_column();
+
+CREATE TRIGGER student_answer_results_insert
+    AFTER INSERT ON student_answer
+    REFERENCING NEW TABLE AS new_answers
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION update_question_result_counts();
+
+CREATE TRIGGER student_answer_results_update
+    AFTER UPDATE ON student_answer
+    REFERENCING OLD TABLE AS old_answers NEW TABLE AS new_answers
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION update_question_result_counts();
+
+CREATE TRIGGER student_answer_results_delete
+    AFTER DELETE ON student_answer
+    REFERENCING OLD TABLE AS old_answers
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION update_question_result_counts();
+"""
+
+def _is_partitioned():
+    return op.get_bind().execute(sa.text(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = 'student_answer'::regclass"
+    )).scalar()
+
+def _detach(table):
+    op.execute(f"ALTER TABLE student_answer RENAME TO {table}")
+    op.execute("DROP INDEX idx_student_answer_question, idx_student_answer_device")
+    op.execute(f"ALTER TABLE {table} " + ", ".join(f"DROP CONSTRAINT IF EXISTS {name}" for name in CONSTRAINTS))
+
+def upgrade():
+    if _is_partitioned():
+        return
+    _detach("student_answer_unpartitioned")
+    op.execute("""
+        CREATE TABLE student_answer (
+            id INTEGER NOT NULL DEFAULT nextval('student_answer_id_seq'),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            question_id INTEGER REFERENCES question(id) ON DELETE CASCADE,
+            answer_option_id INTEGER REFERENCES answer_option(id) ON DELETE CASCADE,
+            device_id VARCHAR(255) NOT NULL,
+            answer_created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, answer_created_at)
+        ) PARTITION BY RANGE (answer_created_at)
+    """)
+    # Keep the id sequence alive when the old table is dropped
+    op.execute("ALTER SEQUENCE student_answer_id_seq OWNED BY student_answer.id")
+    op.execute("CREATE TABLE student_answer_default PARTITION OF student_answer DEFAULT")
+    op.execute(PARTITION_FUNCTION)
+    op.execute("""
+        SELECT create_student_answer_partition(month::DATE)
+        FROM generate_series(
+            date_trunc('month', COALESCE(
+                (SELECT MIN(COALESCE(answer_created_at, created_at)) FROM student_answer_unpartitioned),
+                CURRENT_TIMESTAMP
+            )),
+            date_trunc('month', CURRENT_TIMESTAMP) + INTERVAL '2 months',
+            INTERVAL '1 month'
+        ) AS month
+    """)
+    op.execute(f"""
+        INSERT INTO student_answer ({COLUMNS})
+        SELECT id, created_at, changed_at, question_id, answer_option_id, device_id,
+               COALESCE(answer_created_at, created_at, CURRENT_TIMESTAMP)
+        FROM student_answer_unpartitioned
+    """)
+    op.execute("DROP TABLE student_answer_unpartitioned")
+    op.execute(TRIGGERS)
+
+def downgrade():
+    if not _is_partitioned():
+        return
+    _detach("student_answer_partitioned")
+    op.execute("""
+        CREATE TABLE student_answer (
+            id INTEGER PRIMARY KEY DEFAULT nextval('student_answer_id_seq'),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            question_id INTEGER REFERENCES question(id) ON DELETE CASCADE,
+            answer_option_id INTEGER REFERENCES answer_option(id) ON DELETE CASCADE,
+            device_id VARCHAR(255) NOT NULL,
+            answer_created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    op.execute("ALTER SEQUENCE student_answer_id_seq OWNED BY student_answer.id")
+    op.execute(f"INSERT INTO student_answer ({COLUMNS}) SELECT {COLUMNS} FROM student_answer_partitioned")
+    op.execute("DROP TABLE student_answer_partitioned CASCADE")
+    op.execute("DROP FUNCTION IF EXISTS create_student_answer_partition(DATE)")
+    op.execute(TRIGGERS)
@@ -0,0 +1,41 @@
+"""Composite and covering indexes on student_answer
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+
+Replaces the single-column indexes with ones matching the queries:
+- (question_id, answer_option_id) for per-question tallies, exports and
+  counter rebuilds, which are answered from the index alone
+- (device_id, question_id) including the chosen option and answer time,
+  for a device's answers within a question or lecture
+- (answer_option_id) so deleting an answer option does not scan the table
+  for the cascaded delete
+
+The old indexes are prefixes of the new ones and are dropped. Indexes on
+the partitioned table are built on every partition, holding a lock that
+blocks writes while they are built.
+"""
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.execute("CREATE INDEX IF NOT EXISTS idx_student_answer_question_option ON student_answer(question_id, answer_option_id)")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_student_answer_device_question ON student_answer(device_id, question_id) "
+        "INCLUDE (answer_option_id, answer_created_at)"
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS idx_student_answer_option ON student_answer(answer_option_id)")
+    op.execute("DROP INDEX IF EXISTS idx_student_answer_question")
+    op.execute("DROP INDEX IF EXISTS idx_student_answer_device")
+
+def downgrade():
+    op.execute("CREATE INDEX IF NOT EXISTS idx_student_answer_question ON student_answer(question_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_student_answer_device ON student_answer(device_id)")
+    op.execute("DROP INDEX IF EXISTS idx_student_answer_option")
+    op.execute("DROP INDEX IF EXISTS idx_student_answer_device_question")
+    op.execute("DROP INDEX IF EXISTS idx_student_answer_question_option")
@@ -0,0 +1,55 @@
+"""Natural key for answer upserts
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+
+Adds student_answer_key, which maps (device_id, question_id) to the current
+answer so submissions can upsert with INSERT ... ON CONFLICT. A unique index
+on student_answer itself would have to include the partition key. Existing
+answers are keyed by the latest answer of each device per question; earlier
+duplicates are kept but no longer updated.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+TABLE = """
+CREATE TABLE student_answer_key (
+    device_id VARCHAR(255) NOT NULL,
+    question_id INTEGER NOT NULL REFERENCES question(id) ON DELETE CASCADE,
+    student_answer_id INTEGER NOT NULL,
+    answer_created_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (device_id, question_id),
+    FOREIGN KEY (student_answer_id, answer_created_at)
+        REFERENCES student_answer(id, answer_created_at) ON DELETE CASCADE
+        DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE INDEX idx_student_answer_key_answer ON student_answer_key(student_answer_id, answer_created_at);
+"""
+
+# Also run when the table came from database_schema.sql, to key answers loaded afterwards.
+# Checked immediately: pending deferred checks would block later DDL on the table in this transaction.
+BACKFILL = """
+SET CONSTRAINTS ALL IMMEDIATE;
+
+INSERT INTO student_answer_key (device_id, question_id, student_answer_id, answer_created_at)
+SELECT DISTINCT ON (device_id, question_id) device_id, question_id, id, answer_created_at
+FROM student_answer
+WHERE question_id IS NOT NULL
+ORDER BY device_id, question_id, answer_created_at DESC, id DESC
+ON CONFLICT DO NOTHING;
+"""
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table("student_answer_key"):
+        op.execute(TABLE)
+    op.execute(BACKFILL)
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS student_answer_key")
@@ -0,0 +1,60 @@
+"""Lecture, educator and institution analytics rollups
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+
+Adds the rollup tables refreshed by analytics.py, and an index on
+student_answer_key(question_id), which the refresh uses to count devices per
+lecture. The same index serves the cascade when a question is deleted.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+COUNTS = """
+    question_count INTEGER NOT NULL DEFAULT 0,
+    answer_count INTEGER NOT NULL DEFAULT 0,
+    correct_answer_count INTEGER NOT NULL DEFAULT 0,
+    device_count INTEGER NOT NULL DEFAULT 0,
+    response_count INTEGER NOT NULL DEFAULT 0,
+    possible_responses INTEGER NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP NOT NULL
+"""
+
+TABLES = f"""
+CREATE TABLE lecture_stats (
+    lecture_id INTEGER PRIMARY KEY REFERENCES lecture(id) ON DELETE CASCADE,
+    educator_id INTEGER,
+    institution_id INTEGER,
+    {COUNTS}
+);
+
+CREATE TABLE educator_stats (
+    educator_id INTEGER PRIMARY KEY REFERENCES educator(id) ON DELETE CASCADE,
+    lecture_count INTEGER NOT NULL DEFAULT 0,
+    {COUNTS}
+);
+
+CREATE TABLE institution_stats (
+    institution_id INTEGER PRIMARY KEY REFERENCES institution(id) ON DELETE CASCADE,
+    lecture_count INTEGER NOT NULL DEFAULT 0,
+    {COUNTS}
+);
+
+CREATE INDEX idx_lecture_stats_educator ON lecture_stats(educator_id);
+CREATE INDEX idx_lecture_stats_institution ON lecture_stats(institution_id);
+"""
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table("lecture_stats"):
+        op.execute(TABLES)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_student_answer_key_question ON student_answer_key(question_id)")
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_student_answer_key_question")
+    op.execute("DROP TABLE IF EXISTS institution_stats, educator_stats, lecture_stats")
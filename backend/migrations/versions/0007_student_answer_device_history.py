@@ -0,0 +1,33 @@
+"""Index a device's answer history in id order
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+
+Replaces idx_student_answer_device_question with an index on (device_id, id)
+including the question, option and answer time. A device's history is paged
+by id, so each page is a range scan of this index without a sort, and the
+lecture and time filters are checked on the included columns. Upserts look
+up (device_id, question_id) in student_answer_key, so nothing needs the old
+index anymore.
+"""
+from alembic import op
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_student_answer_device_history ON student_answer(device_id, id) "
+        "INCLUDE (question_id, answer_option_id, answer_created_at)"
+    )
+    op.execute("DROP INDEX IF EXISTS idx_student_answer_device_question")
+
+def downgrade():
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_student_answer_device_question ON student_answer(device_id, question_id) "
+        "INCLUDE (answer_option_id, answer_created_at)"
+    )
+    op.execute("DROP INDEX IF EXISTS idx_student_answer_device_history")
@@ -0,0 +1,88 @@
+"""Tombstones of deleted questions and answer options for device sync
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+
+Adds sync_tombstone, filled by row triggers on question and answer_option
+whenever a row leaves its lecture: deleted, or moved to another lecture. A
+device syncing a lecture reads the tombstones recorded since its previous
+sync. Rows deleted together with their parent (a question with its lecture,
+an option with its question) get no tombstone: a device drops the options of
+a deleted question, and syncing a deleted lecture answers 404, so its
+tombstones are deleted with it.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+TABLE = """
+CREATE TABLE sync_tombstone (
+    id BIGSERIAL PRIMARY KEY,
+    lecture_id INTEGER NOT NULL REFERENCES lecture(id) ON DELETE CASCADE,
+    table_name VARCHAR(32) NOT NULL,
+    row_id INTEGER NOT NULL,
+    deleted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+FUNCTION = """
+CREATE OR REPLACE FUNCTION record_sync_tombstone()
+RETURNS TRIGGER AS $$
+DECLARE
+    old_lecture_id INTEGER;
+    new_lecture_id INTEGER;
+BEGIN
+    -- Cascaded deletes run after the parent row is gone, so the lookups find nothing for them
+    IF TG_TABLE_NAME = 'question' THEN
+        SELECT id INTO old_lecture_id FROM lecture WHERE id = OLD.lecture_id;
+        IF TG_OP = 'UPDATE' THEN
+            new_lecture_id := NEW.lecture_id;
+        END IF;
+    ELSE
+        SELECT lecture_id INTO old_lecture_id FROM question WHERE id = OLD.question_id;
+        IF TG_OP = 'UPDATE' THEN
+            SELECT lecture_id INTO new_lecture_id FROM question WHERE id = NEW.question_id;
+        END IF;
+    END IF;
+
+    IF old_lecture_id IS NOT NULL AND old_lecture_id IS DISTINCT FROM new_lecture_id THEN
+        INSERT INTO sync_tombstone (lecture_id, table_name, row_id)
+        VALUES (old_lecture_id, TG_TABLE_NAME, OLD.id);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+"""
+
+TRIGGERS = """
+CREATE TRIGGER question_sync_tombstone
+    AFTER DELETE OR UPDATE OF lecture_id ON question
+    FOR EACH ROW
+    EXECUTE FUNCTION record_sync_tombstone();
+
+CREATE TRIGGER answer_option_sync_tombstone
+    AFTER DELETE OR UPDATE OF question_id ON answer_option
+    FOR EACH ROW
+    EXECUTE FUNCTION record_sync_tombstone();
+"""
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table("sync_tombstone"):
+        op.execute(TABLE)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_sync_tombstone_lecture ON sync_tombstone(lecture_id, deleted_at)")
+    op.execute(FUNCTION)
+    op.execute("DROP TRIGGER IF EXISTS question_sync_tombstone ON question")
+    op.execute("DROP TRIGGER IF EXISTS answer_option_sync_tombstone ON answer_option")
+    op.execute(TRIGGERS)
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS question_sync_tombstone ON question")
+    op.execute("DROP TRIGGER IF EXISTS answer_option_sync_tombstone ON answer_option")
+    op.execute("DROP FUNCTION IF EXISTS record_sync_tombstone()")
+    op.execute("DROP TABLE IF EXISTS sync_tombstone")
@@ -0,0 +1,81 @@
+"""Lock question_result counters in key order
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17
+
+An answer changed from option A to B decrements A's counter, then increments
+B's. A concurrent change from B to A locks the same two rows in the opposite
+order, and one of the transactions is aborted as a deadlock; bursts of
+changed answers on one question hit this regularly. The counter function now
+locks every existing counter an UPDATE or DELETE will touch first, in key
+order, as the INSERT of new counters already does.
+"""
+from alembic import op
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+COUNTERS = """
+CREATE OR REPLACE FUNCTION update_question_result_counts()
+RETURNS TRIGGER AS $$
+BEGIN
+{locks}    -- Decrements only update existing counters; cascaded deletes may already have removed them
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE question_result r
+        SET answer_count = r.answer_count - d.answer_count,
+            changed_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT question_id, answer_option_id, COUNT(*) AS answer_count
+            FROM old_answers
+            WHERE question_id IS NOT NULL AND answer_option_id IS NOT NULL
+            GROUP BY question_id, answer_option_id
+        ) d
+        WHERE r.question_id = d.question_id
+          AND r.answer_option_id = d.answer_option_id;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO question_result (question_id, answer_option_id, answer_count)
+        SELECT question_id, answer_option_id, COUNT(*)
+        FROM new_answers
+        WHERE question_id IS NOT NULL AND answer_option_id IS NOT NULL
+        GROUP BY question_id, answer_option_id
+        ORDER BY question_id, answer_option_id
+        ON CONFLICT (question_id, answer_option_id) DO UPDATE
+        SET answer_count = question_result.answer_count + EXCLUDED.answer_count,
+            changed_at = CURRENT_TIMESTAMP;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+"""
+
+LOCKS = """    -- Lock the counters this statement changes in key order before changing any, so concurrent
+    -- statements moving answers between the same options cannot deadlock
+    IF TG_OP = 'UPDATE' THEN
+        PERFORM 1 FROM question_result r
+        WHERE (r.question_id, r.answer_option_id) IN (
+            SELECT question_id, answer_option_id FROM old_answers
+            UNION
+            SELECT question_id, answer_option_id FROM new_answers
+        )
+        ORDER BY r.question_id, r.answer_option_id
+        FOR UPDATE;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM 1 FROM question_result r
+        WHERE (r.question_id, r.answer_option_id) IN (SELECT question_id, answer_option_id FROM old_answers)
+        ORDER BY r.question_id, r.answer_option_id
+        FOR UPDATE;
+    END IF;
+
+"""
+
+def upgrade():
+    op.execute(COUNTERS.format(locks=LOCKS))
+
+def downgrade():
+    op.execute(COUNTERS.format(locks=""))
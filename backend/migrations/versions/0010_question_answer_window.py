@@ -0,0 +1,26 @@
+"""Answer window of a question
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17
+
+Adds question.opens_at and question.closes_at, the UTC times between which
+answers to the question are accepted. Either may be NULL: no opens_at means
+open from the start, no closes_at means open until closed, so existing
+questions keep accepting answers. The API checks the window in memory
+before writing an answer, so neither column is indexed.
+"""
+from alembic import op
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.execute("ALTER TABLE question ADD COLUMN IF NOT EXISTS opens_at TIMESTAMP")
+    op.execute("ALTER TABLE question ADD COLUMN IF NOT EXISTS closes_at TIMESTAMP")
+
+def downgrade():
+    op.execute("ALTER TABLE question DROP COLUMN IF EXISTS closes_at")
+    op.execute("ALTER TABLE question DROP COLUMN IF EXISTS opens_at")
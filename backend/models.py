@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Table
+from sqlalchemy import Column, BigInteger, Integer, String, ForeignKey, ForeignKeyConstraint, DateTime, Table, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -53,7 +53,7 @@ class Lecture(Base):
     # Relationships
     educator = relationship("Educator", back_populates="lectures")
     institution = relationship("Institution", back_populates="lectures", foreign_keys=[institution_id])
-    questions = relationship("Question", back_populates="lecture")
+    questions = relationship("Question", back_populates="lecture", order_by="Question.id")
 
 class Question(Base):
     __tablename__ = "question"
@@ -65,10 +65,13 @@ class Question(Base):
     question_text = Column(String, nullable=False)
     correct_answer_index = Column(Integer, nullable=False)
     question_created_at = Column(DateTime, default=datetime.utcnow)
+    # Answers are accepted from opens_at until closes_at (UTC); NULL leaves that end of the window open
+    opens_at = Column(DateTime, nullable=True)
+    closes_at = Column(DateTime, nullable=True)
 
     # Relationships
     lecture = relationship("Lecture", back_populates="questions")
-    answer_options = relationship("AnswerOption", back_populates="question")
+    answer_options = relationship("AnswerOption", back_populates="question", order_by="AnswerOption.option_index")
     student_answers = relationship("StudentAnswer", back_populates="question")
 
 class AnswerOption(Base):
@@ -87,15 +90,103 @@ class AnswerOption(Base):
 
 class StudentAnswer(Base):
     __tablename__ = "student_answer"
+    # Monthly range partitions on answer_created_at, which is therefore part of the primary key
+    __table_args__ = {"postgresql_partition_by": "RANGE (answer_created_at)"}
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     changed_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     question_id = Column(Integer, ForeignKey("question.id", ondelete="CASCADE"))
     answer_option_id = Column(Integer, ForeignKey("answer_option.id", ondelete="CASCADE"))
     device_id = Column(String(255), nullable=False)
-    answer_created_at = Column(DateTime, default=datetime.utcnow)
+    answer_created_at = Column(DateTime, primary_key=True, default=datetime.utcnow)
 
     # Relationships
     question = relationship("Question", back_populates="student_answers")
-    answer_option = relationship("AnswerOption", back_populates="student_answers") 
\ No newline at end of file
+    answer_option = relationship("AnswerOption", back_populates="student_answers")
+
+class StudentAnswerKey(Base):
+    __tablename__ = "student_answer_key"
+    # One answer per device and question; a unique index on the partitioned table would have to include
+    # answer_created_at, so the natural key lives here and points at the current answer
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["student_answer_id", "answer_created_at"],
+            ["student_answer.id", "student_answer.answer_created_at"],
+            ondelete="CASCADE", deferrable=True, initially="DEFERRED"
+        ),
+        Index("idx_student_answer_key_answer", "student_answer_id", "answer_created_at"),
+        Index("idx_student_answer_key_question", "question_id"),
+    )
+
+    device_id = Column(String(255), primary_key=True)
+    question_id = Column(Integer, ForeignKey("question.id", ondelete="CASCADE"), primary_key=True)
+    student_answer_id = Column(Integer, nullable=False)
+    answer_created_at = Column(DateTime, nullable=False)
+
+class QuestionResult(Base):
+    __tablename__ = "question_result"
+
+    # Maintained by the update_question_result_counts trigger on student_answer
+    question_id = Column(Integer, ForeignKey("question.id", ondelete="CASCADE"), primary_key=True)
+    answer_option_id = Column(Integer, ForeignKey("answer_option.id", ondelete="CASCADE"), primary_key=True)
+    answer_count = Column(Integer, nullable=False, default=0)
+    changed_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Rollups refreshed by analytics.py; only lectures changed since their last refresh are recomputed
+class LectureStats(Base):
+    __tablename__ = "lecture_stats"
+    __table_args__ = (
+        Index("idx_lecture_stats_educator", "educator_id"),
+        Index("idx_lecture_stats_institution", "institution_id"),
+    )
+
+    lecture_id = Column(Integer, ForeignKey("lecture.id", ondelete="CASCADE"), primary_key=True)
+    educator_id = Column(Integer)
+    institution_id = Column(Integer)
+    question_count = Column(Integer, nullable=False, default=0)
+    answer_count = Column(Integer, nullable=False, default=0)
+    correct_answer_count = Column(Integer, nullable=False, default=0)
+    device_count = Column(Integer, nullable=False, default=0)
+    response_count = Column(Integer, nullable=False, default=0)
+    possible_responses = Column(Integer, nullable=False, default=0)
+    refreshed_at = Column(DateTime, nullable=False)
+
+class EducatorStats(Base):
+    __tablename__ = "educator_stats"
+
+    educator_id = Column(Integer, ForeignKey("educator.id", ondelete="CASCADE"), primary_key=True)
+    lecture_count = Column(Integer, nullable=False, default=0)
+    question_count = Column(Integer, nullable=False, default=0)
+    answer_count = Column(Integer, nullable=False, default=0)
+    correct_answer_count = Column(Integer, nullable=False, default=0)
+    device_count = Column(Integer, nullable=False, default=0)
+    response_count = Column(Integer, nullable=False, default=0)
+    possible_responses = Column(Integer, nullable=False, default=0)
+    refreshed_at = Column(DateTime, nullable=False)
+
+class InstitutionStats(Base):
+    __tablename__ = "institution_stats"
+
+    institution_id = Column(Integer, ForeignKey("institution.id", ondelete="CASCADE"), primary_key=True)
+    lecture_count = Column(Integer, nullable=False, default=0)
+    question_count = Column(Integer, nullable=False, default=0)
+    answer_count = Column(Integer, nullable=False, default=0)
+    correct_answer_count = Column(Integer, nullable=False, default=0)
+    device_count = Column(Integer, nullable=False, default=0)
+    response_count = Column(Integer, nullable=False, default=0)
+    possible_responses = Column(Integer, nullable=False, default=0)
+    refreshed_at = Column(DateTime, nullable=False)
+
+class SyncTombstone(Base):
+    __tablename__ = "sync_tombstone"
+    # Written by the record_sync_tombstone trigger when a question or answer option leaves its lecture
+    __table_args__ = (
+        Index("idx_sync_tombstone_lecture", "lecture_id", "deleted_at"),
+    )
+
+    id = Column(BigInteger, primary_key=True)
+    lecture_id = Column(Integer, ForeignKey("lecture.id", ondelete="CASCADE"), nullable=False)
+    table_name = Column(String(32), nullable=False)
+    row_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,43 @@
+import base64
+import json
+from typing import Optional
+from fastapi import HTTPException, Response
+from fastapi.responses import ORJSONResponse
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(last_id: int) -> str:
+    token = base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode())
+    return token.decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        last_id = json.loads(base64.urlsafe_b64decode(padded.encode()))["id"]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(last_id, int):
+        raise ValueError("Invalid cursor")
+    return last_id
+
+async def cursor_param(cursor: Optional[str] = None) -> Optional[int]:
+    # FastAPI dependency turning the opaque ?cursor= token into the last seen id
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def set_next_cursor(response: Response, rows, limit: int):
+    # A full page means there may be more rows after the last one returned
+    if rows and len(rows) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].id)
+    return rows
+
+def page_response(rows, limit: int) -> ORJSONResponse:
+    # Fast path for list routes: column rows are serialized by orjson as they are, without building
+    # a Pydantic model per row; the route's response_model still documents the shape
+    response = ORJSONResponse([row._asdict() for row in rows])
+    set_next_cursor(response, rows, limit)
+    return response
@@ -0,0 +1,125 @@
+"""Maintain the monthly partitions of student_answer.
+
+Creates partitions ahead of time and retires old ones by detaching them,
+which is a catalog change instead of a large DELETE. Detached partitions are
+dropped, moved to an archive schema, or left as standalone tables. Retired
+answers are subtracted from the question_result counters and their upsert
+keys deleted, so the analytics answer totals (from the counters) and device
+and response counts (from the keys) keep describing the same answers.
+
+    python partition_maintenance.py --months-ahead 3 --retain-months 12 --archive-schema archive
+"""
+import argparse
+import re
+from datetime import date
+from sqlalchemy import text
+from database import engine
+
+PARTITION_NAME = re.compile(r"^student_answer_(\d{4})_(\d{2})$")
+
+# Takes a partition's answers out of the counters. Detaching fires no delete triggers; like the
+# update_question_result_counts trigger, this locks the counters in key order before changing them.
+# Bumping changed_at makes the next analytics refresh recompute the affected lectures.
+RETIRE_COUNTS = """
+    WITH retired AS (
+        SELECT question_id, answer_option_id, COUNT(*) AS answer_count
+        FROM "{name}"
+        WHERE question_id IS NOT NULL AND answer_option_id IS NOT NULL
+        GROUP BY question_id, answer_option_id
+    ), locked AS (
+        SELECT r.question_id, r.answer_option_id
+        FROM question_result r
+        JOIN retired d ON d.question_id = r.question_id AND d.answer_option_id = r.answer_option_id
+        ORDER BY r.question_id, r.answer_option_id
+        FOR UPDATE OF r
+    )
+    UPDATE question_result r
+    SET answer_count = r.answer_count - d.answer_count,
+        changed_at = CURRENT_TIMESTAMP
+    FROM retired d
+    JOIN locked l ON l.question_id = d.question_id AND l.answer_option_id = d.answer_option_id
+    WHERE r.question_id = d.question_id
+      AND r.answer_option_id = d.answer_option_id
+"""
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def list_partitions(connection):
+    result = connection.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = 'student_answer'
+    """))
+    partitions = {}
+    for name in result.scalars():
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+def ensure_partitions(months_ahead: int, today: date):
+    created = []
+    current = date(today.year, today.month, 1)
+    with engine.begin() as connection:
+        existing = list_partitions(connection)
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            if month not in existing:
+                created.append(connection.execute(
+                    text("SELECT create_student_answer_partition(:month)"), {"month": month}
+                ).scalar())
+    return created
+
+def retire_partitions(retain_months: int, today: date, archive_schema: str = None, drop: bool = False,
+                      dry_run: bool = False):
+    cutoff = add_months(date(today.year, today.month, 1), -retain_months)
+    with engine.connect() as connection:
+        expired = [(month, name) for month, name in sorted(list_partitions(connection).items())
+                   if add_months(month, 1) <= cutoff]
+    if dry_run:
+        return [name for _, name in expired]
+
+    for month, name in expired:
+        # One short transaction per partition keeps the lock on student_answer brief
+        with engine.begin() as connection:
+            # Holds off changes to the retired answers (writes to other partitions go on) until the partition
+            # is detached, so the counters lose exactly the answers it holds
+            connection.execute(text(f'LOCK TABLE "{name}" IN SHARE MODE'))
+            connection.execute(text(RETIRE_COUNTS.format(name=name)))
+            # Upsert keys reference the answers; the devices may answer those questions anew afterwards
+            connection.execute(
+                text("DELETE FROM student_answer_key WHERE answer_created_at >= :start AND answer_created_at < :end"),
+                {"start": month, "end": add_months(month, 1)}
+            )
+            connection.execute(text(f'ALTER TABLE student_answer DETACH PARTITION "{name}"'))
+            if drop:
+                connection.execute(text(f'DROP TABLE "{name}"'))
+            elif archive_schema:
+                connection.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{archive_schema}"'))
+                connection.execute(text(f'ALTER TABLE "{name}" SET SCHEMA "{archive_schema}"'))
+    return [name for _, name in expired]
+
+def main():
+    parser = argparse.ArgumentParser(description="Create upcoming and retire old student_answer partitions")
+    parser.add_argument("--months-ahead", type=int, default=3, help="Months of partitions to create in advance")
+    parser.add_argument("--retain-months", type=int, help="Detach partitions older than this many months")
+    parser.add_argument("--archive-schema", help="Move detached partitions into this schema")
+    parser.add_argument("--drop", action="store_true", help="Drop detached partitions instead of keeping them")
+    parser.add_argument("--dry-run", action="store_true", help="Only report the partitions that would be retired")
+    args = parser.parse_args()
+
+    today = date.today()
+    if not args.dry_run:
+        for name in ensure_partitions(args.months_ahead, today):
+            print(f"created {name}")
+    if args.retain_months is not None:
+        action = "would retire" if args.dry_run else "dropped" if args.drop else "detached"
+        for name in retire_partitions(args.retain_months, today, args.archive_schema, args.drop, args.dry_run):
+            print(f"{action} {name}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""In-process registry of the question state answer writes are checked against.
+
+For each question recently answered it holds the answer window (opens_at,
+closes_at) and the ids of the question's answer options, so a submission to
+a closed question, or with an option of another question, is rejected
+without a query. A question missing from the registry is loaded with one
+query for all the questions of a submission; concurrent submissions to it
+wait for that query instead of sending their own.
+
+Writes through this process drop the entries they affect. Writes through
+other workers, or the admin UI, are picked up when the entry expires, after
+QUESTION_STATE_TTL_SECONDS; a closes_at set in advance takes effect exactly
+on every worker.
+"""
+import asyncio
+import itertools
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+from rate_limit import ANSWER_REJECTIONS
+
+# Question state registry configuration
+QUESTION_STATE_TTL_SECONDS = float(os.getenv("QUESTION_STATE_TTL_SECONDS", "5"))
+QUESTION_STATE_MAX_ENTRIES = int(os.getenv("QUESTION_STATE_MAX_ENTRIES", "10000"))
+# Answers arriving this long after closes_at are still accepted, for submissions in flight when it closed
+QUESTION_CLOSE_GRACE_SECONDS = float(os.getenv("QUESTION_CLOSE_GRACE_SECONDS", "2"))
+
+QUESTION_NOT_FOUND = "Question not found"
+QUESTION_NOT_OPEN = "Question is not open for answers"
+QUESTION_CLOSED = "Question is closed for answers"
+OPTION_MISMATCH = "Answer option does not belong to question"
+
+_REJECTION_REASONS = {
+    QUESTION_NOT_FOUND: "unknown_question",
+    QUESTION_NOT_OPEN: "not_open",
+    QUESTION_CLOSED: "closed",
+    OPTION_MISMATCH: "invalid_option"
+}
+
+class QuestionStateRegistry:
+    """Per-process LRU of (expires_at, (opens_at, closes_at, answer option ids)) by question id."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int, close_grace_seconds: float):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.close_grace = timedelta(seconds=close_grace_seconds)
+        self._entries = OrderedDict()
+        # Question id -> future of the load in progress, resolving to the states it read
+        self._loading = {}
+        # Ids each query in progress may still store; an invalidation removes its ids from all of them,
+        # so a query that raced a write does not cache what it read before the write
+        self._fetching = {}
+        self._fetch_ids = itertools.count()
+
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.invalidations = 0
+        self.rejected = 0
+
+    async def check(self, db: AsyncSession, answers):
+        # answers: objects with question_id and answer_option_id. Returns None per accepted answer,
+        # else the rejection message, in input order.
+        now = time.monotonic()
+        # Hits keep the state they had here: the load below may invalidate or evict their entries
+        states = {}
+        question_ids = set()
+        for answer in answers:
+            question_id = answer.question_id
+            if question_id in states or question_id in question_ids:
+                continue
+            entry = self._entries.get(question_id)
+            if entry is None or entry[0] <= now:
+                question_ids.add(question_id)
+            else:
+                states[question_id] = entry[1]
+                self._entries.move_to_end(question_id)
+        for answer in answers:
+            if answer.question_id in states:
+                self.hits += 1
+            else:
+                self.misses += 1
+        # Misses are checked against the rows just read even if they were not cached
+        if question_ids:
+            states.update(await self._load(db, question_ids))
+
+        utcnow = datetime.utcnow()
+        rejections = []
+        for answer in answers:
+            rejection = self._check(states[answer.question_id], answer.answer_option_id, utcnow)
+            if rejection is not None:
+                self.rejected += 1
+                ANSWER_REJECTIONS.labels(_REJECTION_REASONS[rejection]).inc()
+            rejections.append(rejection)
+        return rejections
+
+    def _check(self, state, answer_option_id: int, utcnow: datetime):
+        if state is None:
+            return QUESTION_NOT_FOUND
+        opens_at, closes_at, option_ids = state
+        if opens_at is not None and utcnow < opens_at:
+            return QUESTION_NOT_OPEN
+        if closes_at is not None and utcnow >= closes_at + self.close_grace:
+            return QUESTION_CLOSED
+        if answer_option_id not in option_ids:
+            return OPTION_MISMATCH
+        return None
+
+    async def _load(self, db: AsyncSession, question_ids):
+        # Returns question id -> (opens_at, closes_at, answer option ids), or None if it does not exist
+        waiting = {question_id: self._loading[question_id] for question_id in question_ids
+                   if question_id in self._loading}
+        question_ids = [question_id for question_id in question_ids if question_id not in waiting]
+        states = {}
+        if question_ids:
+            future = asyncio.get_running_loop().create_future()
+            for question_id in question_ids:
+                self._loading[question_id] = future
+            try:
+                states = await self._fetch(db, question_ids)
+            finally:
+                for question_id in question_ids:
+                    del self._loading[question_id]
+                future.set_result(states)
+        if waiting:
+            for future in set(waiting.values()):
+                loaded = await future
+                states.update((question_id, loaded[question_id]) for question_id in waiting if question_id in loaded)
+            # Questions whose awaited load failed are read here
+            missing = [question_id for question_id in waiting if question_id not in states]
+            if missing:
+                states.update(await self._fetch(db, missing))
+        return states
+
+    async def _fetch(self, db: AsyncSession, question_ids):
+        fetch_id = next(self._fetch_ids)
+        self._fetching[fetch_id] = cacheable = set(question_ids)
+        try:
+            result = await db.execute(
+                select(models.Question.id, models.Question.opens_at, models.Question.closes_at, models.AnswerOption.id)
+                .join(models.AnswerOption, models.AnswerOption.question_id == models.Question.id, isouter=True)
+                .filter(models.Question.id.in_(question_ids))
+            )
+            rows = result.all()
+        finally:
+            del self._fetching[fetch_id]
+        self.loads += 1
+        options = {}
+        for question_id, opens_at, closes_at, answer_option_id in rows:
+            _, _, option_ids = options.setdefault(question_id, (opens_at, closes_at, set()))
+            if answer_option_id is not None:
+                option_ids.add(answer_option_id)
+        states = {question_id: None for question_id in question_ids}
+        for question_id, (opens_at, closes_at, option_ids) in options.items():
+            states[question_id] = (opens_at, closes_at, frozenset(option_ids))
+
+        expires_at = time.monotonic() + self.ttl
+        for question_id in cacheable:
+            if states[question_id] is None:
+                self._entries.pop(question_id, None)
+            else:
+                self._entries[question_id] = (expires_at, states[question_id])
+                self._entries.move_to_end(question_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return states
+
+    def invalidate(self, *question_ids: int):
+        for cacheable in self._fetching.values():
+            cacheable.difference_update(question_ids)
+        for question_id in question_ids:
+            if self._entries.pop(question_id, None) is not None:
+                self.invalidations += 1
+
+    def metrics(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "close_grace_seconds": self.close_grace.total_seconds(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "loads": self.loads,
+            "invalidations": self.invalidations,
+            "rejected": self.rejected
+        }
+
+question_states = QuestionStateRegistry(
+    QUESTION_STATE_TTL_SECONDS, QUESTION_STATE_MAX_ENTRIES, QUESTION_CLOSE_GRACE_SECONDS
+)
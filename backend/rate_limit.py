@@ -0,0 +1,213 @@
+"""Rate limiting and admission control for the answer write path.
+
+Every answer takes one token from the bucket of its device and one from
+the bucket of its question; a request is admitted only if each of its
+buckets holds a token for every answer it carries there. Before that, admission control sheds submissions
+while the API's connection pool is saturated, so a burst queues in clients
+instead of in the pool, where it would also hold up every other request.
+"""
+import math
+import os
+import time
+from collections import OrderedDict
+from prometheus_client import Counter
+from instrumentation import pool_pressure
+
+# Rate limit configuration
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory, redis or none
+RATE_LIMIT_DEVICE_PER_SECOND = float(os.getenv("RATE_LIMIT_DEVICE_PER_SECOND", "2"))
+RATE_LIMIT_DEVICE_BURST = float(os.getenv("RATE_LIMIT_DEVICE_BURST", "10"))
+RATE_LIMIT_QUESTION_PER_SECOND = float(os.getenv("RATE_LIMIT_QUESTION_PER_SECOND", "500"))
+RATE_LIMIT_QUESTION_BURST = float(os.getenv("RATE_LIMIT_QUESTION_BURST", "2000"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0"))
+RATE_LIMIT_KEY_PREFIX = os.getenv("RATE_LIMIT_KEY_PREFIX", "engaged:rate:")
+
+# Admission control configuration; a wait of 0 disables it
+ADMISSION_MAX_POOL_WAIT_MS = float(os.getenv("ADMISSION_MAX_POOL_WAIT_MS", "1000"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+
+ANSWER_REJECTIONS = Counter(
+    "answer_write_rejections", "Answer submissions rejected before reaching the database", ["reason"]
+)
+
+class RateLimitStats:
+    def __init__(self):
+        self.admitted = 0
+        self.limited = 0
+        self.errors = 0
+
+    def as_dict(self):
+        return {"admitted": self.admitted, "limited": self.limited, "errors": self.errors}
+
+class NullRateLimiter:
+    backend = "none"
+
+    def __init__(self):
+        self.stats = RateLimitStats()
+
+    async def acquire(self, buckets):
+        # buckets: (key, tokens per second, burst, tokens to take) tuples, at most burst tokens taken from each.
+        # Returns 0 if admitted, else seconds until it would be.
+        self.stats.admitted += 1
+        return 0.0
+
+    def metrics(self):
+        return {"backend": self.backend, **self.stats.as_dict()}
+
+class MemoryRateLimiter(NullRateLimiter):
+    """Per-process token buckets, least recently used ones dropped beyond max_keys."""
+
+    backend = "memory"
+
+    def __init__(self, max_keys: int):
+        super().__init__()
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    async def acquire(self, buckets):
+        now = time.monotonic()
+        levels = []
+        wait = 0.0
+        for key, rate, burst, cost in buckets:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            levels.append(tokens)
+            if tokens < cost:
+                wait = max(wait, (cost - tokens) / rate)
+        if wait > 0:
+            self.stats.limited += 1
+            return wait
+
+        # No await since the check, so no other request took these tokens meanwhile
+        for (key, _, _, cost), tokens in zip(buckets, levels):
+            self._buckets[key] = (tokens - cost, now)
+            self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        self.stats.admitted += 1
+        return 0.0
+
+    def metrics(self):
+        return {**super().metrics(), "keys": len(self._buckets), "max_keys": self.max_keys}
+
+# Checks every bucket, then takes its tokens from each only if all have enough. Uses the server clock,
+# so all workers agree; answers the wait in seconds as a string, as Lua numbers are returned truncated.
+TOKEN_BUCKET_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[3 * i - 2])
+    local burst = tonumber(ARGV[3 * i - 1])
+    local cost = tonumber(ARGV[3 * i])
+    local bucket = redis.call('HMGET', key, 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or burst
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+    levels[i] = tokens
+    if tokens < cost then
+        wait = math.max(wait, (cost - tokens) / rate)
+    end
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[3 * i - 2])
+    local burst = tonumber(ARGV[3 * i - 1])
+    local cost = tonumber(ARGV[3 * i])
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - cost), 'updated', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil(burst / rate * 1000))
+end
+return '0'
+"""
+
+class RedisRateLimiter(NullRateLimiter):
+    """Token buckets shared by all workers, on any client exposing the async redis register_script API.
+
+    A bucket expires once it would be full again. If the server cannot be
+    reached, submissions are admitted and counted as errors.
+    """
+
+    backend = "redis"
+
+    def __init__(self, client, key_prefix: str = ""):
+        super().__init__()
+        self.key_prefix = key_prefix
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def acquire(self, buckets):
+        args = []
+        for _, rate, burst, cost in buckets:
+            args += [rate, burst, cost]
+        try:
+            wait = float(await self._script(keys=[self.key_prefix + key for key, _, _, _ in buckets], args=args))
+        except Exception:
+            self.stats.errors += 1
+            return 0.0
+        if wait > 0:
+            self.stats.limited += 1
+            return wait
+        self.stats.admitted += 1
+        return 0.0
+
+def create_rate_limiter(backend: str = RATE_LIMIT_BACKEND):
+    if backend == "memory":
+        return MemoryRateLimiter(RATE_LIMIT_MAX_KEYS)
+    if backend == "redis":
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the redis package")
+        return RedisRateLimiter(redis.from_url(RATE_LIMIT_REDIS_URL), RATE_LIMIT_KEY_PREFIX)
+    if backend == "none":
+        return NullRateLimiter()
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend}")
+
+def answer_buckets(pairs):
+    # pairs: (device_id, question_id) of each answer in a submission. Each answer costs a token of its device
+    # and of its question. A bucket is charged at most its burst, else a submission carrying more answers
+    # than that could never be admitted: it waits for a full bucket instead, and empties it.
+    devices = {}
+    questions = {}
+    for device_id, question_id in pairs:
+        devices[device_id] = devices.get(device_id, 0) + 1
+        questions[question_id] = questions.get(question_id, 0) + 1
+    buckets = [(f"device:{device_id}", RATE_LIMIT_DEVICE_PER_SECOND, RATE_LIMIT_DEVICE_BURST,
+                min(count, RATE_LIMIT_DEVICE_BURST)) for device_id, count in sorted(devices.items())]
+    buckets += [(f"question:{question_id}", RATE_LIMIT_QUESTION_PER_SECOND, RATE_LIMIT_QUESTION_BURST,
+                 min(count, RATE_LIMIT_QUESTION_BURST)) for question_id, count in sorted(questions.items())]
+    return buckets
+
+class AdmissionControl:
+    """Sheds answer submissions while checkouts from the API's connection pool wait too long."""
+
+    def __init__(self, pressure, max_wait_ms: float):
+        self.pressure = pressure
+        self.max_wait_ms = max_wait_ms
+        self.admitted = 0
+        self.shed = 0
+
+    def admit(self):
+        if self.max_wait_ms > 0 and self.pressure.wait_seconds() * 1000 >= self.max_wait_ms:
+            self.shed += 1
+            return False
+        self.admitted += 1
+        return True
+
+    def metrics(self):
+        return {
+            "max_pool_wait_ms": self.max_wait_ms,
+            "pool_wait_ms": self.pressure.wait_seconds() * 1000,
+            "pool_waiting": self.pressure.waiting,
+            "admitted": self.admitted,
+            "shed": self.shed
+        }
+
+def retry_after_header(seconds: float):
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+answer_rate_limiter = create_rate_limiter()
+answer_admission = AdmissionControl(pool_pressure["async"], ADMISSION_MAX_POOL_WAIT_MS)
@@ -0,0 +1,230 @@
+"""Vectorized answer reports over many lectures.
+
+Answers are fetched with COPY in PostgreSQL's binary format, which for
+fixed-width, non-null columns is a flat array of records that NumPy reads
+without parsing row by row. Every aggregate is then computed on the arrays.
+
+    python reports.py --institution-id 1 --since 2026-09-01 --until 2027-02-01 > report.json
+"""
+import argparse
+import io
+import json
+from datetime import datetime, timezone
+from typing import Optional
+import numpy as np
+
+PERCENTILES = (50, 90, 99)
+SECONDS_PER_WEEK = 7 * 24 * 3600
+
+# One binary COPY record: field count, then length and big-endian value of each column
+COPY_RECORD = np.dtype([
+    ("fields", ">i2"),
+    ("question_id_length", ">i4"), ("question_id", ">i4"),
+    ("answer_option_id_length", ">i4"), ("answer_option_id", ">i4"),
+    ("device_length", ">i4"), ("device", ">i8"),
+    ("answered_at_length", ">i4"), ("answered_at", ">f8"),
+])
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+
+# Devices are reduced to a 64-bit hash so every column is fixed width
+ANSWERS_QUERY = """
+    SELECT sa.question_id, sa.answer_option_id,
+           ('x' || substr(md5(sa.device_id), 1, 16))::bit(64)::bigint,
+           EXTRACT(EPOCH FROM sa.answer_created_at)::float8
+    FROM student_answer sa
+    JOIN question q ON q.id = sa.question_id
+    JOIN lecture l ON l.id = q.lecture_id
+    WHERE sa.answer_option_id IS NOT NULL
+"""
+
+QUESTIONS_QUERY = """
+    SELECT q.id, q.lecture_id, q.correct_answer_index
+    FROM question q
+    JOIN lecture l ON l.id = q.lecture_id
+    WHERE TRUE
+"""
+
+def _filters(lecture_id: Optional[int], educator_id: Optional[int], institution_id: Optional[int],
+             since: Optional[datetime] = None, until: Optional[datetime] = None):
+    clauses, params = [], {}
+    for column, name, value in (("l.id", "lecture_id", lecture_id), ("l.educator_id", "educator_id", educator_id),
+                                ("l.institution_id", "institution_id", institution_id),):
+        if value is not None:
+            clauses.append(f"{column} = %({name})s")
+            params[name] = value
+    # answer_created_at filters prune the student_answer partitions
+    if since is not None:
+        clauses.append("sa.answer_created_at >= %(since)s")
+        params["since"] = since
+    if until is not None:
+        clauses.append("sa.answer_created_at < %(until)s")
+        params["until"] = until
+    return "".join(f" AND {clause}" for clause in clauses), params
+
+def parse_copy_binary(data: bytes) -> np.ndarray:
+    if not data.startswith(COPY_SIGNATURE):
+        raise ValueError("Not a binary COPY stream")
+    header_length = 19 + int.from_bytes(data[15:19], "big")
+    records = np.frombuffer(data, dtype=COPY_RECORD, offset=header_length,
+                            count=(len(data) - header_length - 2) // COPY_RECORD.itemsize)
+    if len(records) and ((records["fields"] != 4).any() or (records["device_length"] != 8).any()):
+        raise ValueError("Unexpected record layout in COPY stream")
+    return records
+
+def fetch_answers(connection, lecture_id=None, educator_id=None, institution_id=None, since=None, until=None):
+    # connection: a SQLAlchemy connection on the psycopg2 (sync) engine
+    where, params = _filters(lecture_id, educator_id, institution_id, since, until)
+    buffer = io.BytesIO()
+    with connection.connection.cursor() as cursor:
+        query = cursor.mogrify(ANSWERS_QUERY + where, params).decode()
+        cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT binary)", buffer)
+    records = parse_copy_binary(buffer.getvalue())
+    return {
+        "question_id": records["question_id"].astype(np.int64),
+        "answer_option_id": records["answer_option_id"].astype(np.int64),
+        "device": records["device"].astype(np.int64),
+        "answered_at": records["answered_at"].astype(np.float64),
+    }
+
+def _lookup(ids, values, size):
+    # Dense id -> value array, so mapping millions of answers is one indexing operation
+    table = np.full(size, -1, dtype=np.int64)
+    table[ids] = values
+    return table
+
+def _cohorts(device_codes, answered_at):
+    # Devices grouped by the week of their first answer, with how many of them answered in each later week
+    week = np.floor(answered_at / SECONDS_PER_WEEK + 3 / 7).astype(np.int64)  # weeks starting on Monday
+    first_week = week.min()
+    week -= first_week
+    span = int(week.max()) + 1
+
+    device_first = np.full(int(device_codes.max()) + 1, span, dtype=np.int64)
+    np.minimum.at(device_first, device_codes, week)
+    active_device, active_week = np.divmod(np.unique(device_codes * span + week), span)
+    cohort = device_first[active_device]
+    retention = np.zeros((span, span), dtype=np.int64)
+    np.add.at(retention, (cohort, active_week - cohort), 1)
+
+    return [
+        {
+            "week_start": datetime.fromtimestamp(((first_week + index) * 7 - 3) * 86400, timezone.utc).date(),
+            "devices": int(retention[index, 0]),
+            "active_by_week": retention[index, :span - index].tolist()
+        }
+        for index in np.unique(device_first).tolist()
+    ]
+
+def build_report(answers, questions, option_indexes):
+    # answers: arrays from fetch_answers; questions: (id, lecture_id, correct_answer_index) rows;
+    # option_indexes: (answer_option id, option_index) rows
+    question_ids = answers["question_id"]
+    option_ids = answers["answer_option_id"]
+    answered_at = answers["answered_at"]
+    total = len(question_ids)
+    device_ids, device_codes = np.unique(answers["device"], return_inverse=True)
+
+    report = {
+        "answers": total,
+        "correct_answers": 0,
+        "accuracy": 0.0,
+        "devices": len(device_ids),
+        "response_seconds": {f"p{p}": 0.0 for p in PERCENTILES},
+        "lectures": [],
+        "questions": [],
+        "cohorts": []
+    }
+    if not total:
+        return report
+
+    question_rows = np.array(questions, dtype=np.int64).reshape(-1, 3)
+    option_rows = np.array(option_indexes, dtype=np.int64).reshape(-1, 2)
+    question_space = int(max(question_rows[:, 0].max(initial=0), question_ids.max())) + 1
+    option_space = int(max(option_rows[:, 0].max(initial=0), option_ids.max())) + 1
+    lecture_of = _lookup(question_rows[:, 0], question_rows[:, 1], question_space)
+    correct_index_of = _lookup(question_rows[:, 0], question_rows[:, 2], question_space)
+    option_index_of = _lookup(option_rows[:, 0], option_rows[:, 1], option_space)
+
+    correct = option_index_of[option_ids] == correct_index_of[question_ids]
+    report["correct_answers"] = int(correct.sum())
+    report["accuracy"] = float(correct.mean())
+
+    # Sorting by question, then time, gives each question a contiguous run of answers in time order
+    order = np.lexsort((answered_at, question_ids))
+    sorted_questions = question_ids[order]
+    sorted_times = answered_at[order]
+    starts = np.flatnonzero(np.r_[True, sorted_questions[1:] != sorted_questions[:-1]])
+    counts = np.diff(np.r_[starts, total])
+    run_questions = sorted_questions[starts]
+
+    # Response time: seconds since the first answer to the same question, already sorted within each run
+    response = sorted_times - np.repeat(sorted_times[starts], counts)
+    report["response_seconds"] = {
+        f"p{p}": float(value) for p, value in zip(PERCENTILES, np.percentile(response, PERCENTILES))
+    }
+    question_percentiles = {
+        f"p{p}": response[starts + np.floor((counts - 1) * p / 100).astype(np.int64)] for p in PERCENTILES
+    }
+    correct_counts = np.add.reduceat(correct[order].astype(np.int64), starts)
+
+    # Option distribution: counts of (question, option) pairs, which sort by question like the runs
+    pair_keys, pair_counts = np.unique(question_ids * option_space + option_ids, return_counts=True)
+    pair_questions, pair_options = np.divmod(pair_keys, option_space)
+    pair_starts = np.searchsorted(pair_questions, run_questions, side="left")
+    pair_ends = np.searchsorted(pair_questions, run_questions, side="right")
+
+    for index, question_id in enumerate(run_questions.tolist()):
+        options = slice(pair_starts[index], pair_ends[index])
+        report["questions"].append({
+            "question_id": question_id,
+            "lecture_id": int(lecture_of[question_id]),
+            "answers": int(counts[index]),
+            "accuracy": float(correct_counts[index] / counts[index]),
+            "options": dict(zip(pair_options[options].tolist(), pair_counts[options].tolist())),
+            "response_seconds": {name: float(values[index]) for name, values in question_percentiles.items()}
+        })
+
+    # Per lecture: answers, accuracy and distinct devices
+    lecture_ids, lecture_index = np.unique(lecture_of[question_ids], return_inverse=True)
+    lecture_answers = np.bincount(lecture_index)
+    lecture_correct = np.bincount(lecture_index, weights=correct)
+    lecture_devices = np.bincount(np.unique(lecture_index * len(device_ids) + device_codes) // len(device_ids),
+                                  minlength=len(lecture_ids))
+    for lecture_id, answers_count, correct_count, devices in zip(
+            lecture_ids.tolist(), lecture_answers.tolist(), lecture_correct.tolist(), lecture_devices.tolist()):
+        report["lectures"].append({
+            "lecture_id": lecture_id,
+            "answers": answers_count,
+            "accuracy": correct_count / answers_count,
+            "devices": devices
+        })
+
+    report["cohorts"] = _cohorts(device_codes, answered_at)
+    return report
+
+def answer_report(connection, lecture_id=None, educator_id=None, institution_id=None, since=None, until=None):
+    answers = fetch_answers(connection, lecture_id, educator_id, institution_id, since, until)
+    where, params = _filters(lecture_id, educator_id, institution_id)
+    questions = connection.exec_driver_sql(QUESTIONS_QUERY + where, params).all()
+    option_indexes = connection.exec_driver_sql(
+        "SELECT o.id, o.option_index FROM answer_option o JOIN question q ON q.id = o.question_id "
+        "JOIN lecture l ON l.id = q.lecture_id WHERE TRUE" + where, params
+    ).all()
+    return build_report(answers, questions, option_indexes)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an answer report over many lectures")
+    parser.add_argument("--lecture-id", type=int)
+    parser.add_argument("--educator-id", type=int)
+    parser.add_argument("--institution-id", type=int)
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Only answers at or after this time")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="Only answers before this time")
+    args = parser.parse_args()
+
+    from database import engine
+    with engine.connect() as connection:
+        report = answer_report(connection, args.lecture_id, args.educator_id, args.institution_id, args.since, args.until)
+    print(json.dumps(report, default=str, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
-from datetime import datetime
-from typing import Optional, List
+from pydantic import BaseModel, Field, computed_field, field_validator, model_validator
+from datetime import date, datetime, timezone
+from typing import Dict, Optional, List
 
 # Institution schemas
 class InstitutionBase(BaseModel):
@@ -67,7 +67,20 @@ class Lecture(LectureBase):
         from_attributes = True
 
 # Question schemas
-class QuestionBase(BaseModel):
+class AnswerWindow(BaseModel):
+    # Answers are accepted from opens_at until closes_at; None leaves that end open
+    opens_at: Optional[datetime] = None
+    closes_at: Optional[datetime] = None
+
+    @field_validator("opens_at", "closes_at")
+    @classmethod
+    def to_utc(cls, value: Optional[datetime]):
+        # Stored and compared as naive UTC, like every other timestamp
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+class QuestionBase(AnswerWindow):
     lecture_id: int
     question_text: str
     correct_answer_index: int
@@ -75,7 +88,7 @@ class QuestionBase(BaseModel):
 class QuestionCreate(QuestionBase):
     pass
 
-class QuestionUpdate(BaseModel):
+class QuestionUpdate(AnswerWindow):
     lecture_id: Optional[int] = None
     question_text: Optional[str] = None
     correct_answer_index: Optional[int] = None
@@ -111,6 +124,37 @@ class AnswerOption(AnswerOptionBase):
     class Config:
         from_attributes = True
 
+# Nested lecture schemas
+class QuestionWithOptions(Question):
+    answer_options: List[AnswerOption] = []
+
+class LectureFull(Lecture):
+    questions: List[QuestionWithOptions] = []
+
+# Lecture question tree schemas
+LECTURE_QUESTIONS_MAX = 500
+
+class AnswerOptionTreeCreate(BaseModel):
+    answer_text: str
+    option_index: int
+
+class QuestionTreeCreate(AnswerWindow):
+    question_text: str
+    correct_answer_index: int
+    answer_options: List[AnswerOptionTreeCreate] = Field(min_length=1)
+
+    @model_validator(mode="after")
+    def check_correct_answer_index(self):
+        indexes = [option.option_index for option in self.answer_options]
+        if len(set(indexes)) != len(indexes):
+            raise ValueError("option_index must be unique within a question")
+        if self.correct_answer_index not in indexes:
+            raise ValueError("correct_answer_index does not match the option_index of any answer option")
+        return self
+
+class LectureQuestionsCreate(BaseModel):
+    questions: List[QuestionTreeCreate] = Field(max_length=LECTURE_QUESTIONS_MAX)
+
 # Student Answer schemas
 class StudentAnswerBase(BaseModel):
     question_id: int
@@ -132,4 +176,164 @@ class StudentAnswer(StudentAnswerBase):
     answer_created_at: datetime
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+# Device history schemas
+DEVICE_HISTORY_MAX_LIMIT = 1000
+
+class StudentAnswerCompact(BaseModel):
+    # Just enough to restore a device's answers after it reconnects
+    id: int
+    question_id: int
+    answer_option_id: int
+
+    class Config:
+        from_attributes = True
+
+class StudentAnswerSubmission(StudentAnswer):
+    # created, updated (the device changed its answer) or unchanged (a retry); superseded when a later
+    # answer from the device to the question, written in the same transaction, replaced it
+    status: str
+
+# Student Answer batch schemas
+STUDENT_ANSWER_BATCH_MAX = 5000
+
+class StudentAnswerBatchCreate(BaseModel):
+    answers: List[StudentAnswerCreate] = Field(min_length=1, max_length=STUDENT_ANSWER_BATCH_MAX)
+
+class StudentAnswerBatchItem(BaseModel):
+    index: int
+    status: str
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+class StudentAnswerBatchResult(BaseModel):
+    created: int
+    updated: int
+    unchanged: int
+    superseded: int
+    rejected: int
+    results: List[StudentAnswerBatchItem]
+
+# Device sync schemas
+class SyncAnswer(BaseModel):
+    question_id: int
+    answer_option_id: int
+
+class LectureSyncRequest(BaseModel):
+    device_id: str
+    # The watermark returned by the device's previous sync of the lecture; omitted on the first one
+    since: Optional[datetime] = None
+    # Answers queued while the device was offline
+    answers: List[SyncAnswer] = Field(default=[], max_length=STUDENT_ANSWER_BATCH_MAX)
+
+class LectureSync(BaseModel):
+    # Pass as since on the next sync
+    watermark: datetime
+    # True: the rows below are the whole lecture and replace the device's copy.
+    # False: they are the rows changed since the previous sync, to be upserted by id.
+    full: bool
+    lecture: Optional[Lecture] = None
+    questions: List[Question] = []
+    answer_options: List[AnswerOption] = []
+    # Removed from the lecture since the previous sync; the options of a removed question go with it
+    deleted_question_ids: List[int] = []
+    deleted_answer_option_ids: List[int] = []
+    answers: Optional[StudentAnswerBatchResult] = None
+
+# Result schemas
+class AnswerOptionResult(BaseModel):
+    answer_option_id: int
+    option_index: int
+    answer_text: str
+    answer_count: int
+
+class QuestionResult(BaseModel):
+    question_id: int
+    question_text: str
+    correct_answer_index: int
+    total_answers: int
+    options: List[AnswerOptionResult]
+
+class LectureResult(BaseModel):
+    lecture_id: int
+    total_answers: int
+    questions: List[QuestionResult]
+
+# Analytics schemas
+class AnalyticsStats(BaseModel):
+    question_count: int
+    answer_count: int
+    correct_answer_count: int
+    device_count: int
+    response_count: int
+    possible_responses: int
+    refreshed_at: datetime
+
+    @computed_field
+    @property
+    def correct_ratio(self) -> float:
+        # Share of answers choosing the option whose option_index is the question's correct_answer_index
+        return self.correct_answer_count / self.answer_count if self.answer_count else 0.0
+
+    @computed_field
+    @property
+    def participation_rate(self) -> float:
+        # Share of the questions answered by the devices that took part
+        return self.response_count / self.possible_responses if self.possible_responses else 0.0
+
+    class Config:
+        from_attributes = True
+
+class LectureStats(AnalyticsStats):
+    lecture_id: int
+    educator_id: Optional[int] = None
+    institution_id: Optional[int] = None
+
+class EducatorStats(AnalyticsStats):
+    educator_id: int
+    lecture_count: int
+
+class InstitutionStats(AnalyticsStats):
+    institution_id: int
+    lecture_count: int
+
+class AnalyticsRefreshResult(BaseModel):
+    lectures: int
+    educators: int
+    institutions: int
+
+# Report schemas
+class ResponseTimes(BaseModel):
+    p50: float
+    p90: float
+    p99: float
+
+class QuestionReport(BaseModel):
+    question_id: int
+    lecture_id: int
+    answers: int
+    accuracy: float
+    options: Dict[int, int]
+    response_seconds: ResponseTimes
+
+class LectureReport(BaseModel):
+    lecture_id: int
+    answers: int
+    accuracy: float
+    devices: int
+
+class DeviceCohort(BaseModel):
+    week_start: date
+    devices: int
+    active_by_week: List[int]
+
+class AnswerReport(BaseModel):
+    answers: int
+    correct_answers: int
+    accuracy: float
+    devices: int
+    response_seconds: ResponseTimes
+    lectures: List[LectureReport]
+    questions: List[QuestionReport]
+    cohorts: List[DeviceCohort]
@@ -0,0 +1,81 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from sqlalchemy.exc import DBAPIError, IntegrityError
+import crud
+from answer_buffer import AnswerBuffer, AnswerRejected, FlushFailed, ANSWER_CONFLICT
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+def database_error(pgcode):
+    orig = Exception(pgcode)
+    orig.pgcode = pgcode
+    return DBAPIError("INSERT", {}, orig)
+
+def buffer():
+    return AnswerBuffer(FakeSession, flush_interval_ms=0, max_batch=10, max_pending=10, flush_retries=2)
+
+def answer(question_id):
+    return SimpleNamespace(question_id=question_id)
+
+def flush(answers, insert, monkeypatch):
+    """Flushes answers through a buffer whose writes go to insert; returns the buffer and each answer's future."""
+    monkeypatch.setattr(crud, "insert_student_answers", insert)
+    answer_buffer = buffer()
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        batch = [(0, item, loop.create_future()) for item in answers]
+        await answer_buffer._flush(batch)
+        return [future for _, _, future in batch]
+
+    return answer_buffer, asyncio.run(run())
+
+def test_deadlocked_batch_is_written_again(monkeypatch):
+    failures = [database_error("40P01")]
+
+    async def insert(db, answers):
+        if failures:
+            raise failures.pop()
+        return [item.question_id for item in answers]
+
+    answer_buffer, futures = flush([answer(1), answer(2)], insert, monkeypatch)
+    assert [future.result() for future in futures] == [1, 2]
+    assert answer_buffer.retried_flushes == 1
+
+def test_batch_failing_after_the_retries_fails_every_answer(monkeypatch):
+    async def insert(db, answers):
+        raise database_error("40001")
+
+    answer_buffer, futures = flush([answer(1), answer(2)], insert, monkeypatch)
+    for future in futures:
+        with pytest.raises(FlushFailed):
+            future.result()
+    assert answer_buffer.retried_flushes == 2
+    assert answer_buffer.failed_flushes == 1
+
+def test_other_database_errors_are_not_retried(monkeypatch):
+    async def insert(db, answers):
+        raise database_error("53300")
+
+    answer_buffer, futures = flush([answer(1)], insert, monkeypatch)
+    with pytest.raises(FlushFailed):
+        futures[0].result()
+    assert answer_buffer.retried_flushes == 0
+
+def test_integrity_error_rejects_only_the_offending_answer(monkeypatch):
+    async def insert(db, answers):
+        if any(item.question_id == 3 for item in answers):
+            raise IntegrityError("INSERT", {}, Exception())
+        return [item.question_id for item in answers]
+
+    answer_buffer, futures = flush([answer(question_id) for question_id in range(1, 6)], insert, monkeypatch)
+    with pytest.raises(AnswerRejected, match=ANSWER_CONFLICT):
+        futures[2].result()
+    assert [future.result() for index, future in enumerate(futures) if index != 2] == [1, 2, 4, 5]
+    assert answer_buffer.failed_flushes == 0
@@ -0,0 +1,90 @@
+import asyncio
+from types import SimpleNamespace
+from question_state import QuestionStateRegistry, QUESTION_NOT_FOUND
+
+QUESTION_ID = 1
+OPTION_ID = 10
+OTHER_QUESTION_ID = 2
+OTHER_OPTION_ID = 20
+
+class FakeSession:
+    """Answers the registry's load query with fixed (question id, opens_at, closes_at, option id) rows."""
+
+    def __init__(self, rows, during_query=None):
+        self.rows = rows
+        self.during_query = during_query
+        self.queries = 0
+
+    async def execute(self, statement):
+        self.queries += 1
+        await asyncio.sleep(0)
+        if self.during_query is not None:
+            self.during_query()
+        return SimpleNamespace(all=lambda: list(self.rows))
+
+def answer(question_id=QUESTION_ID, answer_option_id=OPTION_ID):
+    return SimpleNamespace(question_id=question_id, answer_option_id=answer_option_id)
+
+def registry():
+    return QuestionStateRegistry(ttl_seconds=60, max_entries=100, close_grace_seconds=0)
+
+def test_unrelated_invalidation_during_load_keeps_the_load():
+    states = registry()
+    db = FakeSession([(QUESTION_ID, None, None, OPTION_ID)],
+                     during_query=lambda: states.invalidate(OTHER_QUESTION_ID))
+
+    assert asyncio.run(states.check(db, [answer()])) == [None]
+    assert asyncio.run(states.check(db, [answer()])) == [None]
+    assert db.queries == 1
+
+def test_invalidation_during_load_checks_the_rows_read_without_caching_them():
+    states = registry()
+    db = FakeSession([(QUESTION_ID, None, None, OPTION_ID)],
+                     during_query=lambda: states.invalidate(QUESTION_ID))
+
+    assert asyncio.run(states.check(db, [answer()])) == [None]
+    db.during_query = None
+    assert asyncio.run(states.check(db, [answer()])) == [None]
+    assert db.queries == 2
+
+def test_concurrent_misses_share_one_query():
+    states = registry()
+    db = FakeSession([(QUESTION_ID, None, None, OPTION_ID)])
+
+    async def submit():
+        return await asyncio.gather(*(states.check(db, [answer()]) for _ in range(10)))
+
+    assert asyncio.run(submit()) == [[None]] * 10
+    assert db.queries == 1
+
+def test_unknown_question_is_rejected():
+    states = registry()
+    assert asyncio.run(states.check(FakeSession([]), [answer()])) == [QUESTION_NOT_FOUND]
+
+def test_hit_invalidated_during_the_load_of_a_miss_keeps_its_state():
+    states = registry()
+    asyncio.run(states.check(FakeSession([(QUESTION_ID, None, None, OPTION_ID)]), [answer()]))
+    db = FakeSession([(OTHER_QUESTION_ID, None, None, OTHER_OPTION_ID)],
+                     during_query=lambda: states.invalidate(QUESTION_ID))
+
+    submission = [answer(), answer(OTHER_QUESTION_ID, OTHER_OPTION_ID)]
+    assert asyncio.run(states.check(db, submission)) == [None, None]
+
+def test_hit_evicted_by_the_load_of_a_miss_keeps_its_state():
+    states = QuestionStateRegistry(ttl_seconds=60, max_entries=1, close_grace_seconds=0)
+    asyncio.run(states.check(FakeSession([(QUESTION_ID, None, None, OPTION_ID)]), [answer()]))
+    db = FakeSession([(OTHER_QUESTION_ID, None, None, OTHER_OPTION_ID)])
+
+    submission = [answer(), answer(OTHER_QUESTION_ID, OTHER_OPTION_ID)]
+    assert asyncio.run(states.check(db, submission)) == [None, None]
+
+def test_hits_are_evicted_last():
+    states = QuestionStateRegistry(ttl_seconds=60, max_entries=2, close_grace_seconds=0)
+    for question_id in (QUESTION_ID, OTHER_QUESTION_ID):
+        asyncio.run(states.check(FakeSession([(question_id, None, None, OPTION_ID)]), [answer(question_id)]))
+    asyncio.run(states.check(FakeSession([]), [answer()]))
+    asyncio.run(states.check(FakeSession([(3, None, None, OPTION_ID)]), [answer(3)]))
+
+    db = FakeSession([])
+    assert asyncio.run(states.check(db, [answer()])) == [None]
+    assert db.queries == 0
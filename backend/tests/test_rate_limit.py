@@ -0,0 +1,37 @@
+import asyncio
+import rate_limit
+from rate_limit import MemoryRateLimiter, answer_buckets
+
+def acquire(limiter, buckets):
+    return asyncio.run(limiter.acquire(buckets))
+
+def test_each_answer_costs_a_token_of_its_device_and_question(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_DEVICE_BURST", 10)
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_QUESTION_BURST", 10)
+    buckets = answer_buckets([("a", 1), ("a", 2), ("a", 2), ("b", 2)])
+    assert [(key, cost) for key, _, _, cost in buckets] == [
+        ("device:a", 3), ("device:b", 1), ("question:1", 1), ("question:2", 3)
+    ]
+
+def test_cost_is_capped_at_the_burst(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_DEVICE_BURST", 10)
+    buckets = answer_buckets([("a", question_id) for question_id in range(25)])
+    assert buckets[0] == ("device:a", rate_limit.RATE_LIMIT_DEVICE_PER_SECOND, 10, 10)
+
+def test_batch_takes_a_token_per_answer():
+    limiter = MemoryRateLimiter(max_keys=100)
+    assert acquire(limiter, [("device:a", 1, 5, 3)]) == 0
+    # Two tokens left: a batch of three waits for the third
+    assert acquire(limiter, [("device:a", 1, 5, 3)]) > 0
+    assert acquire(limiter, [("device:a", 1, 5, 2)]) == 0
+
+def test_refused_submission_takes_no_tokens():
+    limiter = MemoryRateLimiter(max_keys=100)
+    assert acquire(limiter, [("device:a", 1, 5, 1), ("question:1", 1, 5, 5)]) == 0
+    assert acquire(limiter, [("device:a", 1, 5, 1), ("question:1", 1, 5, 1)]) > 0
+    assert acquire(limiter, [("device:a", 1, 5, 4)]) == 0
+
+def test_batch_as_large_as_the_burst_is_admitted_on_a_full_bucket():
+    limiter = MemoryRateLimiter(max_keys=100)
+    assert acquire(limiter, [("device:a", 1, 5, 5)]) == 0
+    assert acquire(limiter, [("device:a", 1, 5, 5)]) > 4
@@ -46,7 +46,9 @@ CREATE TABLE question (
     lecture_id INTEGER REFERENCES lecture(id) ON DELETE CASCADE,
     question_text TEXT NOT NULL,
     correct_answer_index INTEGER NOT NULL,
-    question_created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    question_created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    opens_at TIMESTAMP,
+    closes_at TIMESTAMP
 );
 
 -- Create answer_option table
@@ -60,15 +62,109 @@ CREATE TABLE answer_option (
     UNIQUE(question_id, option_index)
 );
 
--- Create student_answer table
+-- Create student_answer table, range partitioned by month of answer_created_at
 CREATE TABLE student_answer (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     question_id INTEGER REFERENCES question(id) ON DELETE CASCADE,
     answer_option_id INTEGER REFERENCES answer_option(id) ON DELETE CASCADE,
     device_id VARCHAR(255) NOT NULL,
-    answer_created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    answer_created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, answer_created_at)
+) PARTITION BY RANGE (answer_created_at);
+
+-- Catch-all for answers outside the monthly partitions
+CREATE TABLE student_answer_default PARTITION OF student_answer DEFAULT;
+
+-- Create function to add the monthly partition containing the given date
+CREATE OR REPLACE FUNCTION create_student_answer_partition(month DATE)
+RETURNS TEXT AS $$
+DECLARE
+    partition_start DATE := date_trunc('month', month)::DATE;
+    partition_name TEXT := 'student_answer_' || to_char(partition_start, 'YYYY_MM');
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF student_answer FOR VALUES FROM (%L) TO (%L)',
+        partition_name, partition_start, (partition_start + INTERVAL '1 month')::DATE
+    );
+    RETURN partition_name;
+END;
+$$ language 'plpgsql';
+
+-- Partitions for the current and the next two months; partition_maintenance.py keeps creating them ahead
+DO $$
+BEGIN
+    PERFORM create_student_answer_partition((CURRENT_DATE + make_interval(months => n))::DATE)
+    FROM generate_series(0, 2) AS n;
+END $$;
+
+-- Create question_result table (per-option answer counters maintained by triggers)
+CREATE TABLE question_result (
+    question_id INTEGER REFERENCES question(id) ON DELETE CASCADE,
+    answer_option_id INTEGER REFERENCES answer_option(id) ON DELETE CASCADE,
+    answer_count INTEGER NOT NULL DEFAULT 0,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (question_id, answer_option_id)
+);
+
+-- Create student_answer_key table (the current answer of each device per question, target of answer upserts)
+CREATE TABLE student_answer_key (
+    device_id VARCHAR(255) NOT NULL,
+    question_id INTEGER NOT NULL REFERENCES question(id) ON DELETE CASCADE,
+    student_answer_id INTEGER NOT NULL,
+    answer_created_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (device_id, question_id),
+    FOREIGN KEY (student_answer_id, answer_created_at)
+        REFERENCES student_answer(id, answer_created_at) ON DELETE CASCADE
+        DEFERRABLE INITIALLY DEFERRED
+);
+
+-- Create analytics rollup tables (refreshed incrementally by backend/analytics.py)
+CREATE TABLE lecture_stats (
+    lecture_id INTEGER PRIMARY KEY REFERENCES lecture(id) ON DELETE CASCADE,
+    educator_id INTEGER,
+    institution_id INTEGER,
+    question_count INTEGER NOT NULL DEFAULT 0,
+    answer_count INTEGER NOT NULL DEFAULT 0,
+    correct_answer_count INTEGER NOT NULL DEFAULT 0,
+    device_count INTEGER NOT NULL DEFAULT 0,
+    response_count INTEGER NOT NULL DEFAULT 0,
+    possible_responses INTEGER NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP NOT NULL
+);
+
+CREATE TABLE educator_stats (
+    educator_id INTEGER PRIMARY KEY REFERENCES educator(id) ON DELETE CASCADE,
+    lecture_count INTEGER NOT NULL DEFAULT 0,
+    question_count INTEGER NOT NULL DEFAULT 0,
+    answer_count INTEGER NOT NULL DEFAULT 0,
+    correct_answer_count INTEGER NOT NULL DEFAULT 0,
+    device_count INTEGER NOT NULL DEFAULT 0,
+    response_count INTEGER NOT NULL DEFAULT 0,
+    possible_responses INTEGER NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP NOT NULL
+);
+
+CREATE TABLE institution_stats (
+    institution_id INTEGER PRIMARY KEY REFERENCES institution(id) ON DELETE CASCADE,
+    lecture_count INTEGER NOT NULL DEFAULT 0,
+    question_count INTEGER NOT NULL DEFAULT 0,
+    answer_count INTEGER NOT NULL DEFAULT 0,
+    correct_answer_count INTEGER NOT NULL DEFAULT 0,
+    device_count INTEGER NOT NULL DEFAULT 0,
+    response_count INTEGER NOT NULL DEFAULT 0,
+    possible_responses INTEGER NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP NOT NULL
+);
+
+-- Create sync_tombstone table (questions and answer options that left a lecture, read by device sync)
+CREATE TABLE sync_tombstone (
+    id BIGSERIAL PRIMARY KEY,
+    lecture_id INTEGER NOT NULL REFERENCES lecture(id) ON DELETE CASCADE,
+    table_name VARCHAR(32) NOT NULL,
+    row_id INTEGER NOT NULL,
+    deleted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Create indexes for better performance
@@ -76,8 +172,14 @@ CREATE INDEX idx_lecture_educator ON lecture(educator_id);
 CREATE INDEX idx_lecture_institution ON lecture(institution_id);
 CREATE INDEX idx_question_lecture ON question(lecture_id);
 CREATE INDEX idx_answer_option_question ON answer_option(question_id);
-CREATE INDEX idx_student_answer_question ON student_answer(question_id);
-CREATE INDEX idx_student_answer_device ON student_answer(device_id);
+CREATE INDEX idx_student_answer_question_option ON student_answer(question_id, answer_option_id);
+CREATE INDEX idx_student_answer_device_history ON student_answer(device_id, id) INCLUDE (question_id, answer_option_id, answer_created_at);
+CREATE INDEX idx_student_answer_option ON student_answer(answer_option_id);
+CREATE INDEX idx_student_answer_key_answer ON student_answer_key(student_answer_id, answer_created_at);
+CREATE INDEX idx_student_answer_key_question ON student_answer_key(question_id);
+CREATE INDEX idx_lecture_stats_educator ON lecture_stats(educator_id);
+CREATE INDEX idx_lecture_stats_institution ON lecture_stats(institution_id);
+CREATE INDEX idx_sync_tombstone_lecture ON sync_tombstone(lecture_id, deleted_at);
 
 -- Create function to update changed_at timestamp
 CREATE OR REPLACE FUNCTION update_changed_at_column()
@@ -122,4 +224,116 @@ CREATE TRIGGER update_answer_option_changed_at
 CREATE TRIGGER update_student_answer_changed_at
     BEFORE UPDATE ON student_answer
     FOR EACH ROW
-    EXECUTE FUNCTION update_changed_at_column(); 
\ No newline at end of file
+    EXECUTE FUNCTION update_changed_at_column();
+
+-- Create function to keep question_result counters in sync with student_answer.
+-- Runs once per statement, so a multi-row insert touches each counter row once.
+CREATE OR REPLACE FUNCTION update_question_result_counts()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Lock the counters this statement changes in key order before changing any, so concurrent
+    -- statements moving answers between the same options cannot deadlock
+    IF TG_OP = 'UPDATE' THEN
+        PERFORM 1 FROM question_result r
+        WHERE (r.question_id, r.answer_option_id) IN (
+            SELECT question_id, answer_option_id FROM old_answers
+            UNION
+            SELECT question_id, answer_option_id FROM new_answers
+        )
+        ORDER BY r.question_id, r.answer_option_id
+        FOR UPDATE;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM 1 FROM question_result r
+        WHERE (r.question_id, r.answer_option_id) IN (SELECT question_id, answer_option_id FROM old_answers)
+        ORDER BY r.question_id, r.answer_option_id
+        FOR UPDATE;
+    END IF;
+
+    -- Decrements only update existing counters; cascaded deletes may already have removed them
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE question_result r
+        SET answer_count = r.answer_count - d.answer_count,
+            changed_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT question_id, answer_option_id, COUNT(*) AS answer_count
+            FROM old_answers
+            WHERE question_id IS NOT NULL AND answer_option_id IS NOT NULL
+            GROUP BY question_id, answer_option_id
+        ) d
+        WHERE r.question_id = d.question_id
+          AND r.answer_option_id = d.answer_option_id;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO question_result (question_id, answer_option_id, answer_count)
+        SELECT question_id, answer_option_id, COUNT(*)
+        FROM new_answers
+        WHERE question_id IS NOT NULL AND answer_option_id IS NOT NULL
+        GROUP BY question_id, answer_option_id
+        ORDER BY question_id, answer_option_id
+        ON CONFLICT (question_id, answer_option_id) DO UPDATE
+        SET answer_count = question_result.answer_count + EXCLUDED.answer_count,
+            changed_at = CURRENT_TIMESTAMP;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER student_answer_results_insert
+    AFTER INSERT ON student_answer
+    REFERENCING NEW TABLE AS new_answers
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION update_question_result_counts();
+
+CREATE TRIGGER student_answer_results_update
+    AFTER UPDATE ON student_answer
+    REFERENCING OLD TABLE AS old_answers NEW TABLE AS new_answers
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION update_question_result_counts();
+
+CREATE TRIGGER student_answer_results_delete
+    AFTER DELETE ON student_answer
+    REFERENCING OLD TABLE AS old_answers
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION update_question_result_counts();
+
+-- Create function to record a tombstone when a question or answer option leaves its lecture
+-- (deleted, or moved to another lecture). Cascaded deletes run after the parent row is gone,
+-- so rows deleted with their lecture or question get none.
+CREATE OR REPLACE FUNCTION record_sync_tombstone()
+RETURNS TRIGGER AS $$
+DECLARE
+    old_lecture_id INTEGER;
+    new_lecture_id INTEGER;
+BEGIN
+    IF TG_TABLE_NAME = 'question' THEN
+        SELECT id INTO old_lecture_id FROM lecture WHERE id = OLD.lecture_id;
+        IF TG_OP = 'UPDATE' THEN
+            new_lecture_id := NEW.lecture_id;
+        END IF;
+    ELSE
+        SELECT lecture_id INTO old_lecture_id FROM question WHERE id = OLD.question_id;
+        IF TG_OP = 'UPDATE' THEN
+            SELECT lecture_id INTO new_lecture_id FROM question WHERE id = NEW.question_id;
+        END IF;
+    END IF;
+
+    IF old_lecture_id IS NOT NULL AND old_lecture_id IS DISTINCT FROM new_lecture_id THEN
+        INSERT INTO sync_tombstone (lecture_id, table_name, row_id)
+        VALUES (old_lecture_id, TG_TABLE_NAME, OLD.id);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER question_sync_tombstone
+    AFTER DELETE OR UPDATE OF lecture_id ON question
+    FOR EACH ROW
+    EXECUTE FUNCTION record_sync_tombstone();
+
+CREATE TRIGGER answer_option_sync_tombstone
+    AFTER DELETE OR UPDATE OF question_id ON answer_option
+    FOR EACH ROW
+    EXECUTE FUNCTION record_sync_tombstone();
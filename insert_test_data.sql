@@ -1043,3 +1043,10 @@ INSERT INTO student_answer (id, question_id, answer_option_id, device_id) VALUES
 (918, 16, 61, '1b12d1c4-1b56-4878-8ca7-1d065c8028c2'),
 (919, 16, 63, '02ec509c-88c5-449e-ab4f-594a681606dd');
 
+-- The rows above have explicit ids; move the sequences past them so rows created later do not collide
+SELECT setval('institution_id_seq', (SELECT MAX(id) FROM institution));
+SELECT setval('educator_id_seq', (SELECT MAX(id) FROM educator));
+SELECT setval('lecture_id_seq', (SELECT MAX(id) FROM lecture));
+SELECT setval('question_id_seq', (SELECT MAX(id) FROM question));
+SELECT setval('answer_option_id_seq', (SELECT MAX(id) FROM answer_option));
+SELECT setval('student_answer_id_seq', (SELECT MAX(id) FROM student_answer));